@@ -1,3 +1,6 @@
+from ExIt.Apprentice.EvaluationCache import EvaluationCache
+import numpy as np
+import copy
 
 
 class BaseApprentice:
@@ -5,6 +8,9 @@ class BaseApprentice:
 
     predictor = None
 
+    # LRU cache of the predictions of states (None = no cache). See set_evaluation_cache.
+    evaluation_cache = None
+
     def init_model(self, input_fv_size, pi_size):
         raise NotImplementedError("Please Implement this method")
 
@@ -17,5 +23,73 @@ class BaseApprentice:
     def pred_pi(self, X):
         raise NotImplementedError("Please Implement this method")
 
+    def predict(self, X):
+        """ Return (pi, v). Override to predict both with a single call """
+        return self.pred_pi(X), self.pred_v(X)
+
+    def predict_batch(self, X):
+        """ Return (pi (B, pi_size), v (B,)) of a batch X (B, fv_size).
+            Override to predict the batch with a single call """
+        predictions = [self.predict(x) for x in X]
+        return [p for p, _ in predictions], [v for _, v in predictions]
+
     def set_model(self, trained_model):
         raise NotImplementedError("Please Implement this method")
+
+    def get_inference_copy(self):
+        """ Return a picklable apprentice that makes the same predictions (e.g. for worker processes).
+            The copy has its own empty evaluation cache. """
+        inference_copy = copy.copy(self)
+        inference_copy.copy_evaluation_cache(self)
+        return inference_copy
+
+    def copy_evaluation_cache(self, apprentice):
+        """ Use an empty evaluation cache of the same size as the cache of the apprentice """
+        cache = apprentice.evaluation_cache
+        self.set_evaluation_cache(None if cache is None else cache.max_bytes / 2**20)
+
+    def set_evaluation_cache(self, max_megabytes=64):
+        """ Cache the predictions of states by Zobrist key (None = no cache).
+            Subclasses must call clear_evaluation_cache when the weights change. """
+        self.evaluation_cache = None if max_megabytes is None else EvaluationCache(max_megabytes)
+
+    def clear_evaluation_cache(self):
+        if self.evaluation_cache is not None:
+            self.evaluation_cache.clear()
+
+    def predict_state(self, state):
+        """ Return (pi, v) of the state, using the evaluation cache if it is enabled """
+        if self.evaluation_cache is None:
+            return self.predict(state.get_feature_vector())
+        key = state.get_key()
+        value = self.evaluation_cache.get(key)
+        if value is None:
+            value = self.predict(state.get_feature_vector())
+            self.evaluation_cache.put(key, value)
+        return value
+
+    def pred_v_state(self, state):
+        """ Return v of the state, using the evaluation cache if it is enabled """
+        if self.evaluation_cache is None:
+            return self.pred_v(state.get_feature_vector())
+        key = state.get_key()
+        value = self.evaluation_cache.get(key, need_pi=False)
+        if value is None:
+            value = None, self.pred_v(state.get_feature_vector())
+            self.evaluation_cache.put(key, value)
+        return value[1]
+
+    def predict_batch_keys(self, keys, X):
+        """ Return (pi, v) of a batch X of states with the Zobrist keys, using the evaluation cache
+            if it is enabled. Only the states that are not cached are predicted (one batch). """
+        if self.evaluation_cache is None:
+            return self.predict_batch(X)
+        values = [self.evaluation_cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if len(missing) > 0:
+            pi, v = self.predict_batch(X[missing])
+            for j, i in enumerate(missing):
+                # A copy, since the row of the batch would keep the whole batch in the cache.
+                values[i] = np.array(pi[j]), float(v[j])
+                self.evaluation_cache.put(keys[i], values[i])
+        return [p for p, _ in values], [v for _, v in values]
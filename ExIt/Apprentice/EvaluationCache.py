@@ -0,0 +1,64 @@
+from collections import OrderedDict
+
+
+class EvaluationCache:
+    """ LRU cache of apprentice predictions keyed by the Zobrist key of the state.
+        The values are (pi, v), where pi is None if only v has been predicted.
+        The size is limited by max_megabytes, estimated from the size of pi. """
+
+    # Approximate size in bytes of one entry without pi (dict entry, key, tuple and v).
+    entry_overhead = 200
+
+    def __init__(self, max_megabytes=64):
+        self.max_bytes = max_megabytes * 2**20
+        self.entries = OrderedDict()
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def entry_size(value):
+        pi = value[0]
+        return EvaluationCache.entry_overhead + (0 if pi is None else getattr(pi, "nbytes", 8 * len(pi)))
+
+    def get(self, key, need_pi=True):
+        """ Return the cached (pi, v) of the key or None. Counts a hit or a miss. """
+        value = self.entries.get(key)
+        if value is None or (need_pi and value[0] is None):
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Store (pi, v) and evict the least recently used entries above the memory cap """
+        old_value = self.entries.pop(key, None)
+        if old_value is not None:
+            self.num_bytes -= EvaluationCache.entry_size(old_value)
+        self.entries[key] = value
+        self.num_bytes += EvaluationCache.entry_size(value)
+        while self.num_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.num_bytes -= EvaluationCache.entry_size(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        """ Remove all entries (used when the weights of the apprentice change) """
+        self.entries.clear()
+        self.num_bytes = 0
+        self.invalidations += 1
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "megabytes": self.num_bytes / 2**20,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups > 0 else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,164 @@
+from ExIt.Apprentice.BaseApprentice import BaseApprentice
+from Games.GameLogic import BaseGameSquareBoard, get_winning_lines
+from Games.ConnectFour import ConnectFour
+from Games.Othello import Othello
+import numpy as np
+
+
+def as_batch(X):
+    """ Return X as a float array (B, fv_size) and True if X was a single feature vector """
+    X = np.asarray(X, dtype=np.float32)
+    if X.ndim == 1:
+        return X[None, :], True
+    return X, False
+
+
+def shift_planes(x, r, c):
+    """ Shift the boards x (B, rows, columns) r rows down and c columns right.
+        Squares shifted in from outside the board are empty. """
+    rows, columns = x.shape[1], x.shape[2]
+    y = np.zeros_like(x)
+    y[:, max(r, 0):rows + min(r, 0), max(c, 0):columns + min(c, 0)] = \
+        x[:, max(-r, 0):rows + min(-r, 0), max(-c, 0):columns + min(-c, 0)]
+    return y
+
+
+def othello_moves(player, opponent):
+    """ Return the legal moves (B, rows, columns) of player given the boards of both players """
+    empty = ~(player | opponent)
+    moves = np.zeros_like(player)
+    for r, c in BaseGameSquareBoard.directions:
+        # Runs of opponent pieces that start next to a player piece.
+        x = shift_planes(player, r, c) & opponent
+        for _ in range(max(player.shape[1], player.shape[2]) - 3):
+            x |= shift_planes(x, r, c) & opponent
+        moves |= shift_planes(x, r, c) & empty
+    return moves
+
+
+def othello_square_weights(rows, columns):
+    """ Corners are good, the squares next to the corners are bad and the edges are good """
+    weights = np.ones((rows, columns))
+    weights[0, :] = weights[-1, :] = weights[:, 0] = weights[:, -1] = 2
+    for i, j in [(0, 0), (0, columns - 1), (rows - 1, 0), (rows - 1, columns - 1)]:
+        weights[max(i - 1, 0):i + 2, max(j - 1, 0):j + 2] = 0.2
+        weights[i, j] = 10
+    return weights.flatten()
+
+
+class Heuristic(BaseApprentice):
+    """ Analytic apprentice (no neural network) for the in-a-row games and Othello.
+        In-a-row games: counting of the open lines of both players.
+        Othello: mobility and corners.
+        X is a feature vector or a batch (B, fv_size) of feature vectors. """
+
+    # The weight of an open line is line_weight ** (number of pieces in the line).
+    line_weight = 4.0
+
+    def __init__(self, game_class, seed=None, noise=0.01):
+        self.rows = game_class.rows
+        self.columns = game_class.columns
+        self.num_squares = game_class.num_squares
+        self.num_actions = game_class.num_actions
+        self.is_othello = isinstance(game_class, Othello)
+        self.gravity = isinstance(game_class, ConnectFour)
+        # Relative random noise added to pi to break ties (seeded for deterministic results).
+        self.rnd = np.random.RandomState(seed)
+        self.noise = noise
+
+        if self.is_othello:
+            self.square_weights = othello_square_weights(self.rows, self.columns)
+        else:
+            self.in_a_row_to_win = game_class.in_a_row_to_win
+            lines = get_winning_lines(self.rows, self.columns, self.in_a_row_to_win)
+            # line_squares[l, i] = 1 if square i is in winning line l.
+            self.line_squares = np.zeros((len(lines), self.num_squares), dtype=np.float32)
+            self.line_squares[np.arange(len(lines))[:, None], lines] = 1
+
+    def init_model(self, input_fv_size, pi_size):
+        if input_fv_size != 2 * self.num_squares or pi_size != self.num_actions:
+            raise Exception("The heuristic was created for another game")
+
+    def pred_pi(self, X):
+        """ Return the action probabilities (num_actions,) or (B, num_actions) """
+        X, single = as_batch(X)
+        if self.is_othello:
+            scores, legal = self.othello_pi_scores(X)
+        else:
+            scores, legal = self.in_a_row_pi_scores(X)
+
+        scores = scores * (1 + self.noise * self.rnd.random_sample(scores.shape))
+        scores = np.where(legal, scores + 1e-6, 0)
+        totals = scores.sum(axis=1, keepdims=True)
+        pi = np.where(totals > 0, scores / np.where(totals > 0, totals, 1), 1 / self.num_actions)
+        return pi[0] if single else pi
+
+    def pred_v(self, X):
+        """ Return the state evaluation (float) or evaluations (B,) """
+        X, single = as_batch(X)
+        if self.is_othello:
+            v = self.othello_v(X)
+        else:
+            v = self.in_a_row_v(X)
+        return float(v[0]) if single else v
+
+    def predict_batch(self, X):
+        return self.pred_pi(X), self.pred_v(X)
+
+    def line_counts(self, X):
+        """ Return the number of pieces of the player and the opponent in every winning line """
+        n = self.num_squares
+        return X[:, :n] @ self.line_squares.T, X[:, n:] @ self.line_squares.T
+
+    def in_a_row_pi_scores(self, X):
+        player, opponent = self.line_counts(X)
+        w = Heuristic.line_weight
+        # Extend open lines of the player and block open lines of the opponent.
+        line_scores = np.where(opponent == 0, w ** player, 0) + np.where(player == 0, w ** opponent, 0)
+        square_scores = line_scores @ self.line_squares
+        occupied = X[:, :self.num_squares] + X[:, self.num_squares:]
+
+        if not self.gravity:
+            return square_scores, occupied == 0
+        # The action of ConnectFour is the column, and the piece falls to the lowest empty square.
+        heights = occupied.reshape(-1, self.rows, self.columns).sum(axis=1).astype(int)
+        legal = heights < self.rows
+        indexes = np.maximum(self.rows - 1 - heights, 0) * self.columns + np.arange(self.columns)
+        return np.take_along_axis(square_scores, indexes, axis=1), legal
+
+    def in_a_row_v(self, X):
+        player, opponent = self.line_counts(X)
+        w = Heuristic.line_weight
+        k = self.in_a_row_to_win
+        own = np.where((opponent == 0) & (player > 0), w ** player, 0).sum(axis=1)
+        other = np.where((player == 0) & (opponent > 0), w ** opponent, 0).sum(axis=1)
+        v = np.tanh((own - other) / w ** (k - 1))
+        v = np.where(player.max(axis=1) >= k, 1.0, v)
+        return np.where(opponent.max(axis=1) >= k, -1.0, v)
+
+    def othello_boards(self, X):
+        n = self.num_squares
+        shape = (-1, self.rows, self.columns)
+        return X[:, :n].reshape(shape) > 0, X[:, n:].reshape(shape) > 0
+
+    def othello_pi_scores(self, X):
+        player, opponent = self.othello_boards(X)
+        legal = othello_moves(player, opponent).reshape(len(X), -1)
+        return legal * self.square_weights, legal
+
+    def othello_v(self, X):
+        player, opponent = self.othello_boards(X)
+        mobility = othello_moves(player, opponent).sum(axis=(1, 2))
+        opponent_mobility = othello_moves(opponent, player).sum(axis=(1, 2))
+        corners = (slice(None), [0, 0, -1, -1], [0, -1, 0, -1])
+        corner_diff = player[corners].sum(axis=1) - opponent[corners].sum(axis=1)
+        v = np.tanh((mobility - opponent_mobility) / (mobility + opponent_mobility + 1) + corner_diff / 2)
+        # When no player can move the game is over, and the player with the most pieces wins.
+        piece_diff = player.sum(axis=(1, 2)) - opponent.sum(axis=(1, 2))
+        return np.where(mobility + opponent_mobility == 0, np.sign(piece_diff), v)
+
+    def train(self, X, Y_pi, Y_r):
+        raise NotImplementedError("The Heuristic does not have this functionality. ")
+
+    def set_model(self, trained_model):
+        raise NotImplementedError("The Heuristic does not have this functionality. ")
@@ -1,5 +1,6 @@
 
 from ExIt.Apprentice.BaseApprentice import BaseApprentice
+from ExIt.Apprentice.NumpyInference import NumpyModel, QuantizedModel, NumpyApprentice, accuracy_report
 from keras.optimizers import SGD, Adam
 from keras.layers.core import Dense
 from keras.layers.normalization import BatchNormalization
@@ -32,13 +33,22 @@ class Nn(BaseApprentice):
     v_size = 1
     regularisation_strength = 0.01
 
-    def __init__(self, use_custom_loss=False):
+    def __init__(self, use_custom_loss=False, use_numpy_inference=True):
         self.optimizer = Adam()
         self.model = None
         self.optimizer = self.optimizer
         self.use_custom_loss = use_custom_loss
         self.policy_network = None
         self.value_network = None
+        # Predict with a NumPy snapshot of the model instead of Keras (training stays on Keras).
+        self.use_numpy_inference = use_numpy_inference
+        # The snapshot is taken at the first prediction after the weights have changed.
+        self.numpy_model = None
+        # Precision of the stored NumPy weights ("float32", "float16" or "int8").
+        # float16 and int8 save memory and show the accuracy loss, but are not faster (see QuantizedModel).
+        self.inference_precision = "float32"
+        # Samples used to calibrate the int8 inference.
+        self.X_calibration = None
 
     def init_model(self, input_fv_size, pi_size):
         # Input layer.
@@ -75,22 +85,76 @@ class Nn(BaseApprentice):
         self.model = model
         self.policy_network = Model(inputs=[input], outputs=[pi])
         self.value_network = Model(inputs=[input], outputs=[v])
+        self.numpy_model = None
+        self.clear_evaluation_cache()
 
     def train(self, X_s, Y_p, Y_v):
         _, policy_loss, value_loss = self.model.train_on_batch(
             x=np.array(X_s),
             y=[np.array(Y_p), np.array(Y_v)]
         )
+        self.numpy_model = None
+        self.clear_evaluation_cache()
         return policy_loss, value_loss
 
+    def get_numpy_model(self):
+        """ Return the NumPy snapshot of the current weights """
+        if self.numpy_model is None:
+            self.numpy_model = NumpyModel.from_keras(self.model)
+            if self.inference_precision != "float32":
+                self.numpy_model = QuantizedModel(self.numpy_model, self.inference_precision, self.X_calibration)
+        return self.numpy_model
+
+    def get_inference_copy(self):
+        """ Keras models can not be pickled, so the copy predicts with the NumPy snapshot """
+        inference_copy = NumpyApprentice(self.get_numpy_model())
+        inference_copy.copy_evaluation_cache(self)
+        return inference_copy
+
+    def set_inference_precision(self, precision, X_calibration=None):
+        """ Predict with "float32", "float16" or "int8" weights (NumPy inference only).
+            The reduced precisions simulate the accuracy loss and are not faster.
+            int8 requires samples (e.g. from the replay memory) to calibrate the layer inputs. """
+        if not self.use_numpy_inference:
+            raise Exception("Reduced precision requires the NumPy inference")
+        self.inference_precision = precision
+        if X_calibration is not None:
+            self.X_calibration = np.array(X_calibration)
+        self.numpy_model = None
+        self.clear_evaluation_cache()
+
+    def get_accuracy_report(self, X):
+        """ Compare the predictions of the current inference precision with
+            the full precision model on the (held-out) samples X """
+        return accuracy_report(NumpyModel.from_keras(self.model), self.get_numpy_model(), X)
+
     def pred_v(self, X):
         """ Return float representing state evaluation """
+        if self.use_numpy_inference:
+            return float(self.get_numpy_model().predict(X)[1])
         return self.value_network.predict(x=np.array([X]))[0][0]
 
     def pred_pi(self, X):
         """ Return array of action probabilities """
+        if self.use_numpy_inference:
+            return self.get_numpy_model().predict(X)[0]
         return self.policy_network.predict(x=np.array([X]))[0]
 
+    def predict(self, X):
+        """ Return the action probabilities and the state evaluation (one forward pass) """
+        if self.use_numpy_inference:
+            pi, v = self.get_numpy_model().predict(X)
+            return pi, float(v)
+        pi, v = self.model.predict(x=np.array([X]))
+        return pi[0], v[0][0]
+
+    def predict_batch(self, X):
+        """ Return the action probabilities (B, pi_size) and evaluations (B,) of a batch (B, fv_size) """
+        if self.use_numpy_inference:
+            return self.get_numpy_model().predict(X)
+        pi, v = self.model.predict(x=np.asarray(X))
+        return pi, v[:, 0]
+
     def set_lr(self, new_lr):
         """ Set new learning rate """
         K.set_value(self.optimizer.lr, new_lr)
@@ -104,3 +168,5 @@ class Nn(BaseApprentice):
         self.model = trained_model
         self.policy_network = Model(inputs=self.model.input, outputs=self.model.output[0])
         self.value_network = Model(inputs=self.model.input, outputs=self.model.output[1])
+        self.numpy_model = None
+        self.clear_evaluation_cache()
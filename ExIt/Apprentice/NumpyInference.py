@@ -0,0 +1,208 @@
+from ExIt.Apprentice.BaseApprentice import BaseApprentice
+import numpy as np
+
+
+""" Inference of the Nn apprentice with NumPy only (no Keras predict).
+    The Dense and BatchNormalization weights of a trained Keras model are
+    copied once, and every BatchNormalization is folded into the Dense layer
+    before it. Dropout is skipped since it does nothing at inference. """
+
+
+def elu(x):
+    return np.where(x > 0, x, np.expm1(np.minimum(x, 0)))
+
+
+def softmax(x):
+    e = np.exp(x - np.max(x, axis=-1, keepdims=True))
+    return e / np.sum(e, axis=-1, keepdims=True)
+
+
+activations = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "elu": elu,
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+    "softmax": softmax
+}
+
+
+def previous_layer(layer):
+    """ Return the layer whose output is the input of the given layer """
+    inbound = layer._inbound_nodes[0].inbound_layers
+    if isinstance(inbound, (list, tuple)):
+        if len(inbound) != 1:
+            raise Exception("Only sequential layers are supported by the NumPy inference")
+        inbound = inbound[0]
+    return inbound
+
+
+def layers_from_input(output_layer):
+    """ Return the layers from the input layer to the given output layer """
+    layers = []
+    layer = output_layer
+    while type(layer).__name__ != "InputLayer":
+        layers.append(layer)
+        layer = previous_layer(layer)
+    return layers[::-1]
+
+
+def fold_layers(keras_layers):
+    """ Return a list of [W, b, activation] with BatchNormalization folded into W and b """
+    folded = []
+    for layer in keras_layers:
+        layer_type = type(layer).__name__
+        config = layer.get_config()
+        if layer_type == "Dense":
+            weights = layer.get_weights()
+            W = weights[0].astype(np.float32)
+            b = weights[1].astype(np.float32) if config.get("use_bias", True) else np.zeros(W.shape[1], np.float32)
+            folded.append([W, b, config.get("activation", "linear")])
+        elif layer_type == "BatchNormalization":
+            weights = layer.get_weights()
+            gamma = weights.pop(0) if config.get("scale", True) else 1.0
+            beta = weights.pop(0) if config.get("center", True) else 0.0
+            mean, variance = weights
+            scale = gamma / np.sqrt(variance + config.get("epsilon", 1e-3))
+            if not folded or folded[-1][2] != "linear":
+                raise Exception("BatchNormalization must follow a linear Dense layer")
+            W, b, activation = folded[-1]
+            folded[-1] = [(W * scale).astype(np.float32), ((b - mean) * scale + beta).astype(np.float32), activation]
+        elif layer_type == "Activation":
+            folded[-1][2] = config.get("activation")
+        elif layer_type != "Dropout":
+            raise Exception("Layer type " + layer_type + " is not supported by the NumPy inference")
+    return folded
+
+
+class NumpyModel:
+    """ Folded copy of the pi and v networks of the Nn apprentice.
+        trunk, pi_head and v_head are lists of [W, b, activation]. """
+
+    def __init__(self, trunk, pi_head, v_head):
+        self.trunk = trunk
+        self.pi_head = pi_head
+        self.v_head = v_head
+
+    @staticmethod
+    def from_keras(model, pi_output="p_output", v_output="v_output"):
+        """ Snapshot a Keras model with one input and the two named output layers """
+        pi_layers = layers_from_input(model.get_layer(pi_output))
+        v_layers = layers_from_input(model.get_layer(v_output))
+        # The trunk is the layers shared by the two heads.
+        n = 0
+        while n < min(len(pi_layers), len(v_layers)) and pi_layers[n] is v_layers[n]:
+            n += 1
+        return NumpyModel(fold_layers(pi_layers[:n]), fold_layers(pi_layers[n:]), fold_layers(v_layers[n:]))
+
+    def forward(self, x, layers):
+        for W, b, activation in layers:
+            x = activations[activation](x @ W + b)
+        return x
+
+    def predict(self, X):
+        """ Return (pi, v) of a feature vector, or (B, pi_size) and (B,) of a batch (B, fv_size) """
+        x = self.forward(np.asarray(X, dtype=np.float32), self.trunk)
+        pi = self.forward(x, self.pi_head)
+        v = self.forward(x, self.v_head)
+        return pi, v[..., 0]
+
+
+class QuantizedModel(NumpyModel):
+    """ NumpyModel with the weights stored in reduced precision ("float16" or "int8").
+        int8 uses one weight scale per layer and one input scale per layer,
+        calibrated on samples (e.g. from the replay memory).
+        The weights use 2x (float16) or 4x (int8) less memory, but NumPy has no fast
+        float16 or int8 matmul, so the weights are upcast to float32 in forward and
+        inference is not faster than float32. Use it to measure the accuracy of
+        reduced precision weights, not as a throughput mode.
+        The int8 products and sums are exact in float32. """
+
+    def __init__(self, model, precision, X_calibration=None):
+        if precision not in ("float16", "int8"):
+            raise Exception("Unknown precision: " + str(precision))
+        if precision == "int8" and X_calibration is None:
+            raise Exception("int8 precision requires calibration samples")
+        self.precision = precision
+
+        x = None if X_calibration is None else np.atleast_2d(np.asarray(X_calibration, dtype=np.float32))
+        trunk, x = self.quantize(model.trunk, x)
+        pi_head, _ = self.quantize(model.pi_head, x)
+        v_head, _ = self.quantize(model.v_head, x)
+        super().__init__(trunk, pi_head, v_head)
+
+    def quantize(self, layers, x):
+        """ Return the quantized layers [W, b, activation, w_scale, x_scale] and
+            the full precision output of the calibration samples x """
+        quantized = []
+        for W, b, activation in layers:
+            if self.precision == "float16":
+                W_q, b_q, w_scale, x_scale = W.astype(np.float16), b.astype(np.float16), 1.0, None
+            else:
+                w_scale = max(float(np.max(np.abs(W))), 1e-12) / 127
+                x_scale = max(float(np.max(np.abs(x))), 1e-12) / 127
+                W_q, b_q = np.round(W / w_scale).astype(np.int8), b.astype(np.float32)
+            quantized.append([W_q, b_q, activation, w_scale, x_scale])
+            if x is not None:
+                x = activations[activation](x @ W + b)
+        return quantized, x
+
+    def forward(self, x, layers):
+        for W, b, activation, w_scale, x_scale in layers:
+            if x_scale is None:
+                x = x.astype(np.float16).astype(np.float32) @ W.astype(np.float32) + b.astype(np.float32)
+            else:
+                x = (np.clip(np.round(x / x_scale), -127, 127) @ W.astype(np.float32)) * (x_scale * w_scale) + b
+            x = activations[activation](x)
+        return x
+
+    def get_weight_bytes(self):
+        """ Return the number of bytes of the stored weights and biases """
+        return sum(W.nbytes + b.nbytes for W, b, _, _, _ in self.trunk + self.pi_head + self.v_head)
+
+
+class NumpyApprentice(BaseApprentice):
+    """ Apprentice that only predicts with a NumpyModel (no Keras).
+        It can be pickled, and is used as the inference copy of the Nn apprentice. """
+
+    def __init__(self, numpy_model):
+        self.numpy_model = numpy_model
+
+    def init_model(self, input_fv_size, pi_size):
+        pass
+
+    def pred_v(self, X):
+        return float(self.numpy_model.predict(X)[1])
+
+    def pred_pi(self, X):
+        return self.numpy_model.predict(X)[0]
+
+    def predict(self, X):
+        pi, v = self.numpy_model.predict(X)
+        return pi, float(v)
+
+    def predict_batch(self, X):
+        return self.numpy_model.predict(X)
+
+    def train(self, X, Y_pi, Y_r):
+        raise NotImplementedError("The NumpyApprentice does not have this functionality. ")
+
+    def set_model(self, trained_model):
+        raise NotImplementedError("The NumpyApprentice does not have this functionality. ")
+
+
+def accuracy_report(reference, model, X):
+    """ Compare the predictions of model with the reference model on the samples X """
+    X = np.atleast_2d(np.asarray(X, dtype=np.float32))
+    pi_ref, v_ref = reference.predict(X)
+    pi, v = model.predict(X)
+    pi_error = np.abs(pi - pi_ref)
+    v_error = np.abs(v - v_ref)
+    return {
+        "samples": len(X),
+        "pi_max_abs_error": float(np.max(pi_error)),
+        "pi_mean_abs_error": float(np.mean(pi_error)),
+        "pi_argmax_agreement": float(np.mean(np.argmax(pi, axis=1) == np.argmax(pi_ref, axis=1))),
+        "v_max_abs_error": float(np.max(v_error)),
+        "v_mean_abs_error": float(np.mean(v_error))
+    }
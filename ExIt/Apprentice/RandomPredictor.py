@@ -6,15 +6,22 @@ import random
 class RandomPredictor(BaseApprentice):
     """ This class is used for making random predictions """
 
+    def __init__(self, seed=None):
+        self.rnd = random.Random(seed)
+        self.input_fv_size = None
+        self.pi_size = None
+
     def init_model(self, input_fv_size, pi_size):
         self.input_fv_size = input_fv_size
         self.pi_size = pi_size
 
     def pred_v(self, X):
-        return random.uniform(-0.5, 0.5)
+        return self.rnd.uniform(-0.5, 0.5)
 
     def pred_pi(self, X):
-        pi = [random.uniform(0, 1) for _ in range(len(X))]
+        if self.pi_size is None:
+            raise Exception("init_model must be called before pred_pi")
+        pi = [self.rnd.uniform(0, 1) for _ in range(self.pi_size)]
         s = sum(pi)
         return [p / s for p in pi]
 
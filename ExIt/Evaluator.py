@@ -1,6 +1,7 @@
 
 from Games.GameLogic import BaseGame
 from ExIt.Apprentice import BaseApprentice
+import numpy as np
 
 
 def zero_sum_2v2_evaluation(state: BaseGame, original_turn: int, predictor: BaseApprentice):
@@ -8,9 +9,16 @@ def zero_sum_2v2_evaluation(state: BaseGame, original_turn: int, predictor: Base
     if state.is_game_over():
         return state.get_result(original_turn).value
     else:
-        return predictor.pred_v(
-            X=state.get_feature_vector()
-        ) * (1 if state.turn == original_turn else -1)
+        return predictor.pred_v_state(state) * (1 if state.turn == original_turn else -1)
+
+
+def zero_sum_2v2_prediction(state: BaseGame, original_turn: int, predictor: BaseApprentice):
+    """ Return the predicted pi and the evaluation of state (given orientation)
+        from a single prediction. Game over states are not predicted and get a uniform pi. """
+    if state.is_game_over():
+        return np.full(state.num_actions, 1 / state.num_actions), state.get_result(original_turn).value
+    pi, v = predictor.predict_state(state)
+    return pi, v * (1 if state.turn == original_turn else -1)
 
 
 def get_reward_for_action(state: BaseGame, action_index, predictor: BaseApprentice):
@@ -13,3 +13,7 @@ class BaseExpert:
         """ Do policy improvement for a given state.
         :return: a_explore, a_optimal, soft-z """
         raise NotImplementedError("Please Implement this method")
+
+    def reset(self):
+        """ Discard the information kept between searches (e.g. after the apprentice is trained) """
+        pass
@@ -3,93 +3,361 @@ from ExIt.Expert.BaseExpert import BaseExpert
 from ExIt.Apprentice import BaseApprentice
 from Games.GameLogic import BaseGame
 from Misc.TrainingTimer import TrainingTimer
-from ExIt.Evaluator import zero_sum_2v2_evaluation
-from ExIt.Policy import explore_proportional, exploit_action
+from ExIt.Evaluator import zero_sum_2v2_prediction
+from ExIt.Policy import explore_proportional, exploit_action, legal_values
 from math import sqrt
-from random import shuffle
+from ExIt.Expert.MctsTree import MctsTree
+from Misc.Kernels import ucb_select
+import numpy as np
+
+
+def proven_visits(ni, values, root_value):
+    """ Return the visit counts ni of the legal actions, where only the actions that keep
+        the proven root value can be chosen (all actions of a proven loss).
+        values are the proven values of the children of the legal actions. The kept actions
+        count at least one visit, since a child can be proven without visits from the root
+        (e.g. after a collision of the batched search removed its virtual loss). """
+    if root_value < 0:
+        return ni
+    return np.where(values == root_value, np.maximum(ni, 1), 0)
 
 
 class Mcts(BaseExpert):
     """ Monte Carlo Tree Search expert """
 
-    def __init__(self, c=sqrt(2)):
+    def __init__(self, c=sqrt(2), use_symmetry=False, reuse_tree=False, selection="loop", seed=None,
+                 batch_size=1, virtual_loss=1.0, use_solver=False):
         super().__init__()
         # Exploration parameter in UCB.
         self.c = c
+        # UCB selection: "loop" (Python loop over the shuffled legal moves)
+        # or "vectorized" (numpy over the legal mask). The loop is compiled with games that use_jit.
+        if selection not in ("loop", "vectorized"):
+            raise Exception("Unknown selection: " + str(selection))
+        self.selection = selection
+        # Random order of the loop selection and random tiebreaks of the vectorized selection.
+        self.rnd = np.random.RandomState(seed)
+        # Share predictions between symmetric states (using canonical keys).
+        self.use_symmetry = use_symmetry
+        if use_symmetry:
+            self.__name__ += "_Sym"
+        # Number of leaves evaluated by one batched prediction. The paths to the leaves of a batch
+        # are diversified by a virtual loss (a visit with value -virtual_loss until the backup).
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        if batch_size > 1:
+            self.__name__ += "_Batch-" + str(batch_size)
+        # Number of batches, evaluated leaves and leaves lost to collisions (in all searches).
+        self.batch_stats = {"batches": 0, "leaves": 0, "collisions": 0}
+        # MCTS-Solver: propagate proven wins, losses and draws (minimax), skip the proven losing
+        # actions in the selection and stop the search when the root is proven.
+        self.use_solver = use_solver
+        if use_solver:
+            self.__name__ += "_Solver"
+        # Keep the tree between searches and continue from the subtree of the new root.
+        self.reuse_tree = reuse_tree
+        if reuse_tree:
+            self.__name__ += "_Reuse"
+
+        # Node table (created at the first search, when the number of actions is known).
+        self.tree = None
+        # Predictions of canonical states.      E[canonical key] = (canonical P, V)
+        self.E = {}
+        # The Q and V values are seen from this player (the turn of the root).
+        self.tree_turn = None
+        # The predictor that made the predictions of the tree.
+        self.tree_predictor = None
+
+    def reset(self):
+        """ Discard the tree """
+        self.tree = None
+        self.E = {}
+        self.tree_turn = None
+        self.tree_predictor = None
+
+    def reroot(self, state: BaseGame, predictor: BaseApprentice):
+        """ Keep the subtree of the state and discard the nodes that are not reachable from it.
+            Return False if the tree can not be reused. """
+        if self.tree is None or predictor is not self.tree_predictor:
+            return False
+        root = self.tree.get(state.get_key())
+        if root < 0:
+            return False
+        self.tree.reroot(root)
+        # The kept nodes store their predictions, so the symmetric predictions are discarded
+        # with the rest of the old tree (otherwise E grows without bound over a game).
+        self.E = {}
+        if state.turn != self.tree_turn:
+            # The values are seen from the other player now.
+            self.tree.negate()
+            self.tree_turn = state.turn
+        return True
+
+    def select_vectorized(self, node, legal_mask):
+        """ Return a random untried legal action, or else the legal action that maximizes UCB.
+            Ties are broken by a random tiebreak vector. """
+        tree = self.tree
+        n = tree.N[node]
+        tiebreak = self.rnd.random_sample(len(n))
+        untried = legal_mask & (n == 0)
+        if untried.any():
+            return int(np.argmax(np.where(untried, tiebreak, -1)))
+        u = tree.Q[node] + self.c * tree.P[node] * sqrt(tree.N_total[node]) / (1 + n)
+        u = np.where(legal_mask, u, -np.inf)
+        return int(np.argmax(np.where(u == u.max(), tiebreak, -1)))
+
+    def select(self, state: BaseGame, node, legal_mask=None):
+        """ Return the action that maximizes the Upper Confidence Bound (UCB).
+            Only the actions in legal_mask are considered if it is given. """
+        tree = self.tree
+        if self.selection == "vectorized":
+            return self.select_vectorized(node, state.legal_mask() if legal_mask is None else legal_mask)
+        lm = state.get_legal_moves() if legal_mask is None else np.flatnonzero(legal_mask)
+        if state.spec.use_jit:
+            # The loop is compiled with games that use the compiled kernels.
+            return int(ucb_select(self.rnd.permutation(lm), tree.N[node], tree.Q[node], tree.P[node],
+                                  tree.N_total[node], self.c))
+
+        # Python lists are faster than numpy arrays for element access.
+        n, q, p = tree.N[node].tolist(), tree.Q[node].tolist(), tree.P[node].tolist()
+        sqrt_total = sqrt(tree.N_total[node])
+        u_max = -float("inf")
+        a_best = -1
+        for a in self.rnd.permutation(lm).tolist():
+            if n[a] == 0:
+                # Choose this action if it has not been tried.
+                a_best = a
+                break
+            else:
+                u = q[a] + self.c * p[a] * sqrt_total / (1 + n[a])
+            if u > u_max:
+                u_max = u
+                a_best = a
+        return a_best
+
+    def get_batch_stats(self):
+        """ Return the batch statistics. fill = evaluated leaves / (batches * batch_size). """
+        stats = dict(self.batch_stats)
+        batches = stats["batches"]
+        stats["fill"] = stats["leaves"] / (batches * self.batch_size) if batches > 0 else None
+        return stats
 
     def search(self, state: BaseGame, predictor: BaseApprentice, search_time, always_exploit):
-        # Expected Q values from state s.       Q[s]   or   Q[s][a]
-        Q = {}
-        # Number of times state s was visited.  N[s]
-        N = {}
-        # Predicted P values from state s.      P[s]   or   P[s][a]
-        P = {}
-        # Predicted v value of state s.         V[s]
-        V = {}
+        if not self.reuse_tree or not self.reroot(state, predictor):
+            self.reset()
+            self.tree = MctsTree(state.num_actions)
+            self.tree_turn = state.turn
+            self.tree_predictor = predictor
+        tree, E = self.tree, self.E
 
         original_turn = state.turn
+        root_key = state.get_key()
+
+        def evaluate(state):
+            """ Return the predicted P and v value of the state """
+            if not self.use_symmetry:
+                return zero_sum_2v2_prediction(state, original_turn, predictor)
+            c, t = state.get_canonical_key()
+            if c not in E:
+                p, v = zero_sum_2v2_prediction(state, original_turn, predictor)
+                E[c] = state.to_canonical_pi(p, t), v
+            p, v = E[c]
+            return state.from_canonical_pi(p, t), v
+
+        def link(node, a, child):
+            if tree.children[node, a] < 0 and child >= 0:
+                tree.children[node, a] = child
+                tree.parent[child] = node
+
+        def prove(state, node):
+            """ Mark the node as proven if it is game over, if the player to move has a winning action,
+                or if all actions are proven (minimax over the values of the children) """
+            if tree.is_proven(node):
+                return
+            if state.is_game_over():
+                tree.proven[node] = tree.V[node]
+                return
+            values = tree.child_values(node)[state.legal_mask()]
+            # The values are seen from the player of the original turn.
+            best = 1 if state.turn == original_turn else -1
+            if (values == best).any():
+                tree.proven[node] = best
+            elif not np.isnan(values).any():
+                tree.proven[node] = values.max() if best == 1 else values.min()
+
+        def is_proven(state, node):
+            """ Return True if the node is proven. Nodes are proven again when they are visited,
+                since a transposition can prove a child without visiting this node. """
+            if not self.use_solver:
+                return False
+            prove(state, node)
+            return tree.is_proven(node)
+
+        def select(state, node):
+            if not self.use_solver:
+                return self.select(state, node)
+            values = tree.child_values(node)
+            if node == tree.get(root_key):
+                # Skip the actions that are proven losses for the player to move.
+                worst = -1 if state.turn == original_turn else 1
+                return self.select(state, node, state.legal_mask() & (values != worst))
+            # Below the root, only the actions that are not proven are searched
+            # (an unproven node always has an unproven child).
+            return self.select(state, node, state.legal_mask() & np.isnan(values))
 
         def mcts_search(state):
 
-            fv = state.get_feature_vector()
-            lm = state.get_legal_moves()
-            s = tuple(fv)
+            s = state.get_key()
+            node = tree.get(s)
 
             # When unexplored child - predict and store info from this state.
-            if s not in P:
-                P[s] = predictor.pred_pi(X=fv)
-                V[s] = zero_sum_2v2_evaluation(state, original_turn, predictor)
-                N[s] = [0 for _ in range(state.num_actions)]
-                Q[s] = [0 for _ in range(state.num_actions)]
-                return V[s]
+            if node < 0:
+                p, v = evaluate(state)
+                node = tree.add(s, p, v)
+                if self.use_solver:
+                    prove(state, node)
+                return v
+
+            # Return the proven value if the state is proven.
+            if is_proven(state, node):
+                return tree.proven[node]
 
             # Return v value if state is game over.
             if state.is_game_over():
-                return V[s]
-
-            # Find action that maximizes Upper Confidence Bound (UCB).
-            u_max = -float("inf")
-            a_best = -1
-            a_shuffled = list(enumerate(lm))
-            shuffle(a_shuffled)
-            for i, a in a_shuffled:
-                if N[s][a] == 0:
-                    # Choose this action if it has not been tried.
-                    a_best = a
-                    break
-                else:
-                    u = Q[s][a] + self.c * P[s][a] * sqrt(sum(N[s])) / (1 + N[s][a])
-                if u > u_max:
-                    u_max = u
-                    a_best = a
+                return tree.V[node]
+
             # Action that maximizes UCB.
-            a = a_best
+            a = select(state, node)
 
             # Recursive call to find the v value to backpropagate.
-            next_state = state.copy()
-            next_state.advance(a)
-            v = mcts_search(next_state)
+            record = state.advance(a)
+            child = state.get_key()
+            v = mcts_search(state)
+            state.undo(record)
 
             # Backpropagation step - update Q and N.
-            Q[s][a] = (N[s][a] * Q[s][a] + v) / (N[s][a] + 1)
-            N[s][a] += 1
+            link(node, a, tree.get(child))
+            tree.update(node, a, v)
+            if self.use_solver:
+                prove(state, node)
 
             return v
 
+        def collect_leaf(state, pending):
+            """ Descend with virtual loss to a state that is not in the tree.
+                Return (key, feature vector, turn, canonical key, path) of a leaf to evaluate,
+                None if the path ended in a game over state (already backed up),
+                or False if the leaf is already in the batch (collision). """
+            path, records = [], []
+            s = state.get_key()
+            node = tree.get(s)
+            while node >= 0 and not state.is_game_over() and not is_proven(state, node):
+                a = select(state, node)
+                tree.add_virtual_loss(node, a, self.virtual_loss)
+                path.append((node, a))
+                records.append(state.advance(a))
+                s = state.get_key()
+                link(node, a, tree.get(s))
+                node = tree.get(s)
+
+            leaf = None
+            if node >= 0:
+                # Proven or game over state in the tree.
+                backup(path, tree.proven[node] if self.use_solver and tree.is_proven(node) else tree.V[node])
+            elif state.is_game_over():
+                # Game over states are not predicted.
+                p, v = zero_sum_2v2_prediction(state, original_turn, predictor)
+                node = tree.add(s, p, v)
+                link(path[-1][0], path[-1][1], node)
+                backup(path, v)
+                if self.use_solver:
+                    prove(state, node)
+            elif s in pending:
+                for node, a in path:
+                    tree.remove_virtual_loss(node, a, self.virtual_loss)
+                leaf = False
+            else:
+                canonical = state.get_canonical_key() if self.use_symmetry else None
+                leaf = s, state.get_feature_vector().copy(), state.turn, canonical, path
+
+            for (node, _), record in zip(reversed(path), reversed(records)):
+                state.undo(record)
+                if self.use_solver and leaf is None:
+                    prove(state, node)
+            return leaf
+
+        def backup(path, v):
+            for node, a in path:
+                tree.replace_virtual_loss(node, a, self.virtual_loss, v)
+
+        def batch_search(state):
+            """ Collect up to batch_size leaves, predict them with one batch and back them up """
+            leaves, pending = [], set()
+            for _ in range(self.batch_size):
+                leaf = collect_leaf(state, pending)
+                if leaf is False:
+                    self.batch_stats["collisions"] += 1
+                    break
+                if leaf is not None:
+                    leaves.append(leaf)
+                    pending.add(leaf[0])
+            if len(leaves) == 0:
+                return
+
+            # Only the leaves without a prediction of a symmetric state are predicted.
+            predict = [i for i, leaf in enumerate(leaves) if leaf[3] is None or leaf[3][0] not in E]
+            if len(predict) > 0:
+                pi, v = predictor.predict_batch_keys(
+                    [leaves[i][0] for i in predict], np.array([leaves[i][1] for i in predict])
+                )
+                for j, i in enumerate(predict):
+                    s, _, turn, canonical, _ = leaves[i]
+                    v_j = float(v[j]) * (1 if turn == original_turn else -1)
+                    if canonical is not None:
+                        E[canonical[0]] = state.to_canonical_pi(pi[j], canonical[1]), v_j
+                    else:
+                        tree.add(s, pi[j], v_j)
+            for s, _, turn, canonical, path in leaves:
+                if canonical is not None:
+                    p, v_leaf = E[canonical[0]]
+                    tree.add(s, state.from_canonical_pi(p, canonical[1]), v_leaf)
+                node = tree.get(s)
+                link(path[-1][0], path[-1][1], node)
+                backup(path, tree.V[node])
+
+            self.batch_stats["batches"] += 1
+            self.batch_stats["leaves"] += len(leaves)
+
         """ ***** SEARCH CODE ***** """
 
+        # A single mutable state is advanced and undone during the search.
+        search_state = state.copy()
         timer = TrainingTimer(search_time)
         timer.start_new_lap()
-        while timer.has_time_left() or len(N) <= 1:
-            mcts_search(state)
+        s = state.get_key()
+
+        def is_solved():
+            return self.use_solver and tree.get(s) >= 0 and tree.is_proven(tree.get(s))
+
+        while (timer.has_time_left() and not is_solved()) or tree.get(s) < 0 or tree.N_total[tree.get(s)] == 0:
+            if self.batch_size > 1 and tree.get(s) >= 0:
+                batch_search(search_state)
+            else:
+                mcts_search(search_state)
 
         # Get V values and action indexes of legal moves.
         lm = state.get_legal_moves()
-        s = tuple(state.get_feature_vector())
-        ni = [n for i, n in enumerate(N[s]) if i in lm]
+        root = tree.get(s)
+        ni = legal_values(tree.N[root], state.legal_mask())
+        q = tree.Q[root]
+
+        if is_solved():
+            values = legal_values(tree.child_values(root), state.legal_mask())
+            ni = proven_visits(ni, values, tree.proven[root])
+            q = np.full(state.num_actions, tree.proven[root])
 
         a_best = exploit_action(ni, lm)
         if always_exploit:
-            return a_best, a_best, Q[s][a_best]
+            return a_best, a_best, float(q[a_best])
         else:
-            return explore_proportional(ni, lm), a_best, Q[s][a_best]
+            return explore_proportional(ni, lm), a_best, float(q[a_best])
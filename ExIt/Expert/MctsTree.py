@@ -0,0 +1,127 @@
+import numpy as np
+
+
+class MctsTree:
+    """ Node table of Mcts backed by numpy arrays.
+        Row i of the (node x action) arrays N, Q, P and children holds the statistics of node i,
+        and the running total N_total[i] = sum(N[i]) makes UCB selection linear in the actions.
+        The nodes are found by the Zobrist key of the state, so transpositions share a node.
+        The arrays grow in chunks (at least chunk_size nodes, doubling the capacity). """
+
+    chunk_size = 1024
+
+    def __init__(self, num_actions):
+        self.num_actions = num_actions
+        self.size = 0
+        self.capacity = 0
+        # Node index of the Zobrist keys.
+        self.nodes = {}
+        self.keys = np.zeros(0, dtype=np.uint64)
+        # Visit counts, expected values and predicted priors of the actions.
+        self.N = np.zeros((0, num_actions), dtype=np.int32)
+        self.Q = np.zeros((0, num_actions), dtype=np.float32)
+        self.P = np.zeros((0, num_actions), dtype=np.float32)
+        # Child node of each action (-1 = not expanded) and parent node (-1 = root).
+        self.children = np.zeros((0, num_actions), dtype=np.int32)
+        self.parent = np.zeros(0, dtype=np.int32)
+        # Predicted value and total visit count of the nodes.
+        self.V = np.zeros(0, dtype=np.float32)
+        self.N_total = np.zeros(0, dtype=np.int64)
+        # Proven value of the nodes (MCTS-Solver): 1, 0 or -1, and NaN if not proven.
+        self.proven = np.zeros(0, dtype=np.float32)
+
+    def __len__(self):
+        return self.size
+
+    def get(self, key):
+        """ Return the node index of the key, or -1 """
+        return self.nodes.get(key, -1)
+
+    def grow(self, capacity):
+        """ Resize all arrays to the given capacity """
+        for name in ("keys", "N", "Q", "P", "children", "parent", "V", "N_total", "proven"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def add(self, key, p, v, parent=-1):
+        """ Add a node with the prior p and value v. Return its index. """
+        if self.size == self.capacity:
+            self.grow(self.capacity + max(MctsTree.chunk_size, self.capacity))
+        node = self.size
+        self.size += 1
+        self.nodes[key] = node
+        self.keys[node] = key
+        self.N[node] = 0
+        self.Q[node] = 0
+        self.P[node] = p
+        self.children[node] = -1
+        self.parent[node] = parent
+        self.V[node] = v
+        self.N_total[node] = 0
+        self.proven[node] = np.nan
+        return node
+
+    def update(self, node, a, v):
+        """ Back up the value v of action a """
+        n = self.N[node, a]
+        self.Q[node, a] = (n * self.Q[node, a] + v) / (n + 1)
+        self.N[node, a] = n + 1
+        self.N_total[node] += 1
+
+    def is_proven(self, node):
+        return not np.isnan(self.proven[node])
+
+    def child_values(self, node):
+        """ Return the proven values of the children of the node (NaN if not proven or not expanded) """
+        children = self.children[node]
+        return np.where(children >= 0, self.proven[children], np.nan)
+
+    def add_virtual_loss(self, node, a, loss):
+        """ Count a pending visit of action a with the value -loss (batched search) """
+        self.update(node, a, -loss)
+
+    def replace_virtual_loss(self, node, a, loss, v):
+        """ Replace the value -loss of a pending visit with the value v """
+        self.Q[node, a] += (v + loss) / self.N[node, a]
+
+    def remove_virtual_loss(self, node, a, loss):
+        """ Undo a pending visit of action a """
+        n = self.N[node, a]
+        self.Q[node, a] = (n * self.Q[node, a] + loss) / (n - 1) if n > 1 else 0
+        self.N[node, a] = n - 1
+        self.N_total[node] -= 1
+
+    def negate(self):
+        """ See all values from the other player """
+        self.Q[:self.size] *= -1
+        self.V[:self.size] *= -1
+        self.proven[:self.size] *= -1
+
+    def reroot(self, root):
+        """ Keep the nodes reachable from root (which becomes node 0) and discard the others """
+        keep = [root]
+        kept = np.zeros(self.size, dtype=bool)
+        kept[root] = True
+        i = 0
+        while i < len(keep):
+            for child in self.children[keep[i]]:
+                if child >= 0 and not kept[child]:
+                    kept[child] = True
+                    keep.append(child)
+            i += 1
+
+        keep = np.array(keep)
+        new_index = np.full(self.size + 1, -1, dtype=np.int32)
+        new_index[keep] = np.arange(len(keep))
+        for name in ("keys", "N", "Q", "P", "children", "parent", "V", "N_total", "proven"):
+            array = getattr(self, name)
+            array[:len(keep)] = array[keep]
+        # Index -1 maps to -1 (the last element of new_index).
+        self.children[:len(keep)] = new_index[self.children[:len(keep)]]
+        self.parent[:len(keep)] = new_index[self.parent[:len(keep)]]
+        self.parent[0] = -1
+        self.size = len(keep)
+        self.nodes = {int(k): i for i, k in enumerate(self.keys[:self.size])}
@@ -4,14 +4,15 @@ from ExIt.Apprentice import BaseApprentice
 from Games.GameLogic import BaseGame
 from Misc.TrainingTimer import TrainingTimer
 from ExIt.Evaluator import zero_sum_2v2_evaluation
-from ExIt.Policy import explore_proportional_with_guidance, exploit_action, e_greedy, vi_proportional
+from ExIt.Policy import explore_proportional_with_guidance, exploit_action, e_greedy, vi_proportional, \
+    legal_values
 
 
 class Minimax(BaseExpert):
     """ Minimax / Alpha Beta Expert.
         Set use_alpha_beta=True to use Alpha-Beta search instead of Minimax search. """
 
-    def __init__(self, fixed_depth=None, use_ab=False, switch=False):
+    def __init__(self, fixed_depth=None, use_ab=False, switch=False, use_symmetry=False):
         super().__init__()
         self.fixed_depth = fixed_depth
         self.alpha = float('-inf')
@@ -19,9 +20,13 @@ class Minimax(BaseExpert):
         self.stop_search_contradiction = True
         self.use_ab = use_ab
         self.switch = switch
+        # Share evaluations between symmetric states (using canonical keys).
+        self.use_symmetry = use_symmetry
         extra_name = ""
         if fixed_depth is not None:
             extra_name = "_Depth-" + str(fixed_depth)
+        if use_symmetry:
+            extra_name += "_Sym"
         if switch:
             self.__name__ = "AB-Minimax" + extra_name
         else:
@@ -36,6 +41,8 @@ class Minimax(BaseExpert):
             self.use_ab = not self.use_ab
 
         # Predicted v value of state s.         V[s]
+        # Keyed by the Zobrist key of the state (state.get_key()),
+        # or the canonical key of the state when use_symmetry is set.
         V = {}
 
         timer = None
@@ -56,7 +63,7 @@ class Minimax(BaseExpert):
                     (not is_root and timer is not None and not timer.has_time_left()):
                 """ The root will never enter this if-statement.
                     This assumes that the root is never a state that is game over. """
-                s = tuple(state.get_feature_vector())
+                s = state.get_canonical_key()[0] if self.use_symmetry else state.get_key()
                 if s in V:
                     return V[s]
                 else:
@@ -70,12 +77,12 @@ class Minimax(BaseExpert):
                 lm = state.get_legal_moves()
                 vi = [0 for _ in lm]
                 for i, a in enumerate(lm):
-                    c = state.copy()
-                    c.advance(a)
+                    record = state.advance(a)
                     v = max(
                         v,
-                        alpha_beta_search(c, alpha, beta, depth - 1, initial_search=initial_search)
+                        alpha_beta_search(state, alpha, beta, depth - 1, initial_search=initial_search)
                     )
+                    state.undo(record)
                     vi[i] = v
                     if self.use_ab:
                         alpha = max(alpha, v)
@@ -90,12 +97,12 @@ class Minimax(BaseExpert):
                 lm = state.get_legal_moves()
                 vi = [0 for _ in lm]
                 for i, a in enumerate(lm):
-                    c = state.copy()
-                    c.advance(a)
+                    record = state.advance(a)
                     v = min(
                         v,
-                        alpha_beta_search(c, alpha, beta, depth - 1, initial_search=initial_search)
+                        alpha_beta_search(state, alpha, beta, depth - 1, initial_search=initial_search)
                     )
+                    state.undo(record)
                     vi[i] = v
                     if self.use_ab:
                         beta = min(beta, v)
@@ -107,11 +114,14 @@ class Minimax(BaseExpert):
 
         """ ***** SEARCH CODE ***** """
 
+        # A single mutable state is advanced and undone during the search.
+        # The copy ensures that a stopped search does not leave moves on the given state.
+        search_state = state.copy()
         vi, v = None, None
         if self.fixed_depth is not None:
             # Fixed depth.
             vi, v = alpha_beta_search(
-                state=state,
+                state=search_state,
                 alpha=self.alpha,
                 beta=self.beta,
                 depth=self.fixed_depth,
@@ -127,7 +137,7 @@ class Minimax(BaseExpert):
                 self.stop_search_contradiction = True
                 try:
                     vi_new, v_new = alpha_beta_search(
-                        state=state,
+                        state=search_state,
                         alpha=self.alpha,
                         beta=self.beta,
                         depth=depth,
@@ -171,5 +181,5 @@ class Minimax(BaseExpert):
             """
             # Exploration-policy: proportional of the PI with guidance of VI.
             pi = predictor.pred_pi(state.get_feature_vector())
-            pi = [p for i, p in enumerate(pi) if i in lm]
+            pi = legal_values(pi, state.legal_mask())
             return explore_proportional_with_guidance(pi, vi, lm), best_a, v
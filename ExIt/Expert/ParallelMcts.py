@@ -0,0 +1,131 @@
+from ExIt.Expert.BaseExpert import BaseExpert
+from ExIt.Expert.Mcts import Mcts, proven_visits
+from ExIt.Apprentice import BaseApprentice
+from Games.GameLogic import BaseGame
+from ExIt.Policy import explore_proportional, exploit_action, legal_values
+from math import sqrt
+import multiprocessing
+import numpy as np
+
+
+def mcts_worker(connection, mcts_kwargs):
+    """ Search loop of a worker process. The worker keeps its own Mcts (and tree) and
+        the last apprentice it received, and returns the root statistics of every search. """
+    mcts = Mcts(**mcts_kwargs)
+    predictor = None
+    while True:
+        message = connection.recv()
+        if message[0] == "search":
+            _, state, new_predictor, search_time = message
+            if new_predictor is not None:
+                predictor = new_predictor
+            mcts.search(state, predictor, search_time, always_exploit=True)
+            tree = mcts.tree
+            root = tree.get(state.get_key())
+            connection.send((tree.N[root].copy(), tree.Q[root].copy(), tree.proven[root], tree.child_values(root)))
+        elif message[0] == "reset":
+            mcts.reset()
+        elif message[0] == "close":
+            connection.close()
+            return
+
+
+class ParallelMcts(BaseExpert):
+    """ Root parallel Monte Carlo Tree Search expert.
+        num_workers processes search the same root, each with its own tree and a copy of the apprentice
+        (see BaseApprentice.get_inference_copy). The root visit counts of the workers are summed,
+        and the Q values are averaged weighted by the visit counts. """
+
+    def __init__(self, num_workers=None, c=sqrt(2), use_symmetry=False, reuse_tree=False, selection="loop",
+                 seed=None, batch_size=1, virtual_loss=1.0, use_solver=False):
+        super().__init__()
+        self.num_workers = multiprocessing.cpu_count() if num_workers is None else num_workers
+        # Keyword arguments of the Mcts of each worker (the seeds differ between the workers).
+        self.mcts_kwargs = {
+            "c": c,
+            "use_symmetry": use_symmetry,
+            "reuse_tree": reuse_tree,
+            "selection": selection,
+            "batch_size": batch_size,
+            "virtual_loss": virtual_loss,
+            "use_solver": use_solver
+        }
+        self.seed = seed
+        self.__name__ += Mcts(**self.mcts_kwargs).__name__[len("Mcts"):] + "_Workers-" + str(self.num_workers)
+
+        # Worker processes and their connections (started at the first search).
+        self.workers = []
+        self.connections = []
+        # The apprentice that the workers have a copy of.
+        self.worker_predictor = None
+
+    def start_workers(self):
+        # Spawned workers do not inherit the state of Keras from this process.
+        context = multiprocessing.get_context("spawn")
+        for i in range(self.num_workers):
+            connection, worker_connection = context.Pipe()
+            kwargs = dict(self.mcts_kwargs, seed=None if self.seed is None else self.seed + i)
+            worker = context.Process(target=mcts_worker, args=(worker_connection, kwargs), daemon=True)
+            worker.start()
+            self.workers.append(worker)
+            self.connections.append(connection)
+
+    def close(self):
+        """ Stop the worker processes """
+        for connection in self.connections:
+            try:
+                connection.send(("close",))
+                connection.close()
+            except (OSError, EOFError):
+                pass
+        for worker in self.workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = []
+        self.connections = []
+        self.worker_predictor = None
+
+    def __del__(self):
+        self.close()
+
+    def reset(self):
+        """ Discard the trees of the workers and send the apprentice again at the next search """
+        for connection in self.connections:
+            connection.send(("reset",))
+        self.worker_predictor = None
+
+    def search(self, state: BaseGame, predictor: BaseApprentice, search_time, always_exploit):
+        if len(self.workers) == 0:
+            self.start_workers()
+
+        # The apprentice is only sent when it has changed.
+        inference_copy = None
+        if predictor is not self.worker_predictor:
+            inference_copy = predictor.get_inference_copy()
+            self.worker_predictor = predictor
+
+        for connection in self.connections:
+            connection.send(("search", state.copy(), inference_copy, search_time))
+        results = [connection.recv() for connection in self.connections]
+
+        # Merge the root statistics of the workers.
+        N = np.sum([result[0] for result in results], axis=0)
+        W = np.sum([result[0] * result[1] for result in results], axis=0)
+        Q = np.where(N > 0, W / np.maximum(N, 1), 0)
+
+        lm = state.get_legal_moves()
+        ni = legal_values(N, state.legal_mask())
+
+        # MCTS-Solver: the proven values are the same in all workers that proved them.
+        solved = [result for result in results if not np.isnan(result[2])]
+        if len(solved) > 0:
+            _, _, root_value, values = solved[0]
+            ni = proven_visits(ni, legal_values(values, state.legal_mask()), root_value)
+            Q = np.full(state.num_actions, root_value)
+
+        a_best = exploit_action(ni, lm)
+        if always_exploit:
+            return a_best, a_best, float(Q[a_best])
+        else:
+            return explore_proportional(ni, lm), a_best, float(Q[a_best])
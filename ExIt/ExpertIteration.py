@@ -5,6 +5,7 @@ from Games.GameLogic import BaseGame
 from ExIt.Memory import MemoryList, MemorySet, MemoryListGrowing, MemorySetAvg
 from ExIt.Policy import Policy
 from tqdm import tqdm
+from collections import deque
 import numpy as np
 from random import choice as rnd_element
 import random
@@ -12,6 +13,10 @@ import random
 
 DEFAULT_GROWING_SEARCH_VALUE = 0.0005
 DEFAULT_MIN_SEARCH_TIME = 0.1
+# With reduced precision inference, every HELD_OUT_GAME_INTERVAL-th self-play game is not trained on,
+# and its last HELD_OUT_SIZE states are used to measure the inference accuracy.
+HELD_OUT_GAME_INTERVAL = 10
+HELD_OUT_SIZE = 1000
 
 
 def get_growing_search_val(growing_search_time):
@@ -64,7 +69,13 @@ class ExpertIteration:
         "soft_z": False,
         "always_exploit": False,
         "memory": "default",
-        "branch_prob": 0.0
+        "canonical_memory": False,
+        "branch_prob": 0.0,
+        # Precision of the apprentice weights ("float32", "float16" or "int8").
+        # The reduced precisions simulate the accuracy loss and are not faster with NumPy.
+        "inference_precision": "float32",
+        # Memory cap of the apprentice evaluation cache in megabytes (None = no cache).
+        "evaluation_cache_mb": None
     }
 
     def __init__(self, apprentice: BaseApprentice, expert: BaseExpert, **kwargs):
@@ -73,10 +84,16 @@ class ExpertIteration:
 
         self.apprentice = apprentice
         self.expert = expert
+        if self.kwargs.get("evaluation_cache_mb") is not None:
+            # Predictions are reused by the searches of all moves until the apprentice is trained.
+            self.apprentice.set_evaluation_cache(self.kwargs.get("evaluation_cache_mb"))
 
         # ***** Init parameters *****
         self.game_class = None
         self.games_generated = 0
+        # Self-play games and the held-out states of the inference accuracy report.
+        self.self_play_games = 0
+        self.held_out_states = deque(maxlen=HELD_OUT_SIZE)
         self.soft_z = self.kwargs.get("soft_z")
         self.policy = self.kwargs.get("policy")
         self.state_branch_degree = self.kwargs.get("branch_prob")
@@ -99,6 +116,10 @@ class ExpertIteration:
             extra_name += "_MemGrow"
         else:
             raise Exception("Unknown Memory object!")
+        if self.kwargs.get("canonical_memory"):
+            if not hasattr(self.memory, "canonical_game"):
+                raise Exception("canonical_memory requires MemorySet or MemorySetAvg")
+            extra_name += "_Canonical"
 
         if self.kwargs.get("growing_depth"):
             extra_name += "_Grow-depth"
@@ -115,6 +136,10 @@ class ExpertIteration:
             extra_name += "_Branch-" + str(self.state_branch_degree)
         if self.kwargs.get("always_exploit"):
             extra_name += "_Exploit"
+        if self.kwargs.get("inference_precision") != "float32":
+            if not hasattr(self.apprentice, "set_inference_precision"):
+                raise Exception("The apprentice does not support reduced precision inference")
+            extra_name += "_" + self.kwargs.get("inference_precision").capitalize()
 
         # Set same of expert iteration variant.
         self.__name__ = "ExIt_" + str(type(self.apprentice).__name__) + "_" \
@@ -122,11 +147,34 @@ class ExpertIteration:
 
     def set_game(self, game_class):
         self.game_class = game_class.new()
+        if self.kwargs.get("canonical_memory"):
+            # Store symmetric states as one sample.
+            self.memory.canonical_game = self.game_class
         self.apprentice.init_model(
             input_fv_size=game_class.fv_size,
             pi_size=game_class.num_actions
         )
 
+    def calibrate_apprentice(self, X_s):
+        """ Calibrate the reduced precision inference with replay memory samples """
+        if self.kwargs.get("inference_precision") != "float32":
+            self.apprentice.set_inference_precision(self.kwargs.get("inference_precision"), X_calibration=X_s)
+
+    def is_held_out_game(self):
+        """ Return True if the current self-play game is held out of training """
+        return self.kwargs.get("inference_precision") != "float32" \
+            and self.self_play_games % HELD_OUT_GAME_INTERVAL == HELD_OUT_GAME_INTERVAL - 1
+
+    def get_inference_accuracy_report(self):
+        """ Compare the reduced precision inference with the full precision
+            model on the states of the held-out games (not trained on) """
+        if len(self.held_out_states) == 0:
+            raise Exception("No held-out states. Every " + str(HELD_OUT_GAME_INTERVAL)
+                            + "th game is held out when inference_precision is not float32")
+        report = self.apprentice.get_accuracy_report(np.array(self.held_out_states))
+        report["data"] = "held_out"
+        return report
+
     def set_search_time(self, search_time):
         self.__search_time = search_time
 
@@ -142,22 +190,31 @@ class ExpertIteration:
                     # This is used for Minimax variants only.
                     self.expert.fixed_depth += 1
             self.games_generated = 0
+            # The apprentice has been trained since the last game.
+            self.expert.reset()
             state = self.game_class.new()
             s_array, p_array, v_array = self.ex_it_game(state, training_timer)
 
             # If the time is up, don't train since it will result in an unfair advantage.
             if training_timer.has_time_left():
-                # Store game history samples.
-                self.memory.save(
-                    s_array=s_array,
-                    p_array=p_array,
-                    v_array=v_array
-                )
+                held_out = self.is_held_out_game()
+                self.self_play_games += 1
+                if held_out:
+                    # The states are not trained on. They are only used by get_inference_accuracy_report.
+                    self.held_out_states.extend(s_array)
+                else:
+                    # Store game history samples.
+                    self.memory.save(
+                        s_array=s_array,
+                        p_array=p_array,
+                        v_array=v_array
+                    )
 
                 # Train on mini-batches.
                 for _ in range(self.games_generated):
                     X_s, Y_p, Y_v = self.memory.get_batch()
                     pi_loss, v_loss = self.apprentice.train(X_s=X_s, Y_p=Y_p, Y_v=Y_v)
+                    self.calibrate_apprentice(X_s)
                     if verbose:
                         return pi_loss, v_loss
             else:
@@ -234,6 +291,7 @@ class ExpertIteration:
         else:
             # Uses the exploration action to generate pi target.
             pi = generate_pi(state, a)
-        s = state.get_feature_vector()
+        # Copy since the feature vector is a view that changes when the state advances.
+        s = state.get_feature_vector().copy()
         t = state.turn
         return s, pi, v, t, a
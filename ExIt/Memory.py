@@ -1,5 +1,5 @@
 
-from Games.GameLogic import BaseGame
+from Games.GameLogic import BaseGame, get_feature_vector_key
 import numpy as np
 import random
 
@@ -90,6 +90,14 @@ class MemoryListGrowing:
         return len(self.memory[0])
 
 
+def get_sample_key(canonical_game, s, p):
+    """ Return (key, s, p) of a sample. If canonical_game is given,
+        the sample is converted to the canonical form of the symmetric samples. """
+    if canonical_game is None:
+        return get_feature_vector_key(s), s, p
+    return canonical_game.get_canonical_sample(s, p)
+
+
 class MemorySet:
     """ Class that contains the memory logic for improving the Apprentice """
 
@@ -98,11 +106,15 @@ class MemorySet:
 
     def __init__(self):
         self.memory = {}
+        # Set to a game (BaseGameSquareBoard) to store symmetric samples as one sample.
+        self.canonical_game = None
 
     def save(self, s_array, p_array, v_array):
-        """ Stores samples from the previous game and clears the history """
+        """ Stores samples from the previous game and clears the history.
+            The samples are keyed by the Zobrist key of the feature vector. """
         for i, s in enumerate(s_array):
-            self.memory[tuple(s)] = tuple(p_array[i]), v_array[i]
+            key, s, p = get_sample_key(self.canonical_game, s, p_array[i])
+            self.memory[key] = s, tuple(p), v_array[i]
         while len(self.memory) > self.max_memory_size:
             rnd_index = random.choice(list(self.memory.keys()))
             self.memory.pop(rnd_index)
@@ -118,9 +130,10 @@ class MemorySet:
         )
 
         # Extract samples and generate inputs and targets.
-        X_s = np.array(states)[mini_batch_indices]
-        Y_p = [list(self.memory[tuple(key)][0]) for key in X_s]
-        Y_v = [self.memory[tuple(key)][1] for key in X_s]
+        samples = [self.memory[states[i]] for i in mini_batch_indices]
+        X_s = np.array([sample[0] for sample in samples])
+        Y_p = [list(sample[1]) for sample in samples]
+        Y_v = [sample[2] for sample in samples]
 
         return X_s, Y_p, Y_v
 
@@ -137,18 +150,23 @@ class MemorySetAvg:
 
     def __init__(self):
         self.memory = {}
+        # Set to a game (BaseGameSquareBoard) to store symmetric samples as one sample.
+        self.canonical_game = None
 
     def save(self, s_array, p_array, v_array):
+        """ Stores samples and averages the targets of equal states.
+            The samples are keyed by the Zobrist key of the feature vector. """
         for i, s in enumerate(s_array):
-            if tuple(s) not in self.memory:
-                self.memory[tuple(s)] = tuple(p_array[i]), v_array[i], 1
+            key, s, p = get_sample_key(self.canonical_game, s, p_array[i])
+            if key not in self.memory:
+                self.memory[key] = s, tuple(p), v_array[i], 1
             else:
-                pi_avg, v_avg, num_updates = self.memory[tuple(s)]
+                _, pi_avg, v_avg, num_updates = self.memory[key]
                 v_avg_new = (v_array[i] + (v_avg * num_updates)) / (num_updates + 1)
                 pi_avg_new = list(pi_avg)
-                for j, p in enumerate(pi_avg_new):
-                    pi_avg_new[j] = (p_array[i][j] + (p * num_updates)) / (num_updates + 1)
-                self.memory[tuple(s)] = tuple(pi_avg_new), v_avg_new, num_updates+1
+                for j, p_avg in enumerate(pi_avg_new):
+                    pi_avg_new[j] = (p[j] + (p_avg * num_updates)) / (num_updates + 1)
+                self.memory[key] = s, tuple(pi_avg_new), v_avg_new, num_updates+1
 
         while len(self.memory) > self.max_memory_size:
             rnd_index = random.choice(list(self.memory.keys()))
@@ -166,9 +184,10 @@ class MemorySetAvg:
         )
 
         # Extract samples and generate inputs and targets.
-        X_s = np.array(states)[mini_batch_indices]
-        Y_p = [list(self.memory[tuple(key)][0]) for key in X_s]
-        Y_v = [self.memory[tuple(key)][1] for key in X_s]
+        samples = [self.memory[states[i]] for i in mini_batch_indices]
+        X_s = np.array([sample[0] for sample in samples])
+        Y_p = [list(sample[1]) for sample in samples]
+        Y_v = [sample[2] for sample in samples]
 
         return X_s, Y_p, Y_v
 
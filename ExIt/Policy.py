@@ -8,6 +8,13 @@ import random
 exploration_degree = 0.1
 
 
+def legal_values(values, legal_mask):
+    """ Return the values of the legal actions as an array.
+        legal_mask is the bool array from state.legal_mask(). The result corresponds
+        to get_legal_moves, since the legal moves are in increasing order. """
+    return np.asarray(values)[legal_mask]
+
+
 def exploit_action(values, lm):
     """ EXPLOIT.
         Assumes that 'values' has removed moves that are not legal.
@@ -23,8 +30,8 @@ def explore_proportional(values, lm):
     """ EXPLORE.
         Assumes that 'values' has removed moves that are not legal.
         Also assumes that the index of 'values' and legal_moves corresponds. """
-    p = [v/sum(values) for v in values]
-    return np.random.choice(a=lm, size=1, p=p)[0]
+    p = np.asarray(values, dtype=float)
+    return np.random.choice(a=lm, size=1, p=p / p.sum())[0]
 
 
 def e_greedy(xi, lm, e=None):
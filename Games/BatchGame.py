@@ -0,0 +1,103 @@
+from Games.ConnectFour import ConnectFour
+from Games.MnkInARow import MnkInARow
+from Games.GameLogic import get_winning_lines, get_in_a_row_winners
+import numpy as np
+
+
+# Value of BatchInARowGame.winners while a game is not finished.
+NO_WINNER = -2
+
+
+class BatchInARowGame:
+    """ N games of ConnectFour or MnkInARow played in lockstep.
+        The boards are stored in one (N, num_squares) array with the same
+        board values and indexes as the single game classes. """
+
+    def __init__(self, game_class, n):
+        if not isinstance(game_class, (ConnectFour, MnkInARow)):
+            raise Exception("BatchInARowGame only supports ConnectFour and MnkInARow")
+        self.game_class = game_class.new()
+        self.spec = game_class.spec
+        self.n = n
+        self.gravity = isinstance(game_class, ConnectFour)
+        self.lines = get_winning_lines(self.spec.rows, self.spec.columns, self.spec.in_a_row_to_win)
+
+        self.boards = None
+        self.turns = None
+        self.winners = None
+        self.heights = None
+        self.new()
+
+    def new(self):
+        """ Reset all games to the initial state """
+        self.boards = np.zeros((self.n, self.spec.num_squares), dtype=np.int8)
+        self.turns = np.zeros(self.n, dtype=np.int8)
+        # Index of the winning player. (-1 = draw, NO_WINNER = not finished).
+        self.winners = np.full(self.n, NO_WINNER, dtype=np.int8)
+        # Number of pieces in each column (ConnectFour only).
+        self.heights = np.zeros((self.n, self.spec.columns), dtype=np.int8)
+
+    def is_game_over(self):
+        """ Return a bool array (N,) indicating which games are finished """
+        return self.winners != NO_WINNER
+
+    def all_games_over(self):
+        return bool(np.all(self.winners != NO_WINNER))
+
+    def legal_masks(self):
+        """ Return a bool array (N, num_actions) of the legal actions.
+            Finished games have no legal actions. """
+        if self.gravity:
+            masks = self.heights < self.spec.rows
+        else:
+            masks = self.boards == 0
+        masks &= ~self.is_game_over()[:, None]
+        return masks
+
+    def action_to_board_index(self, games, actions):
+        """ Return the board index of the pieces placed by the actions """
+        if not self.gravity:
+            return actions
+        rows, columns = self.spec.rows, self.spec.columns
+        return (rows - 1 - self.heights[games, actions].astype(int)) * columns + actions
+
+    def advance(self, actions):
+        """ Advance all unfinished games. actions: int array (N,).
+            The actions of finished games are ignored. """
+        actions = np.asarray(actions)
+        games = np.nonzero(~self.is_game_over())[0]
+        actions = actions[games]
+        if not np.all(self.legal_masks()[games, actions]):
+            raise Exception("Action is not legal")
+
+        indexes = self.action_to_board_index(games, actions)
+        self.boards[games, indexes] = self.turns[games] + 1
+        if self.gravity:
+            self.heights[games, actions] += 1
+
+        self.update_winners(games)
+        self.turns[games] = 1 - self.turns[games]
+
+    def is_terminal(self):
+        """ Return a bool array (N,) indicating which boards have a
+            complete line or are full (one gather-and-reduce for all boards) """
+        return (get_in_a_row_winners(self.boards, self.lines) != 0) | np.all(self.boards != 0, axis=1)
+
+    def update_winners(self, games):
+        """ Set the winner of the games where a player just completed a line
+            and declare a draw when the board is full """
+        winner_values = get_in_a_row_winners(self.boards[games], self.lines)
+        won = winner_values != 0
+        self.winners[games[won]] = winner_values[won] - 1
+
+        games = games[~won]
+        full = np.all(self.boards[games] != 0, axis=1)
+        self.winners[games[full]] = -1
+
+    def get_feature_matrix(self):
+        """ Return the feature vectors of all games as an (N, fv_size) array.
+            Each row is equal to get_feature_vector of the corresponding game. """
+        player_value = (self.turns + 1)[:, None]
+        player_board = self.boards == player_value
+        opponent_board = self.boards == (3 - player_value)
+        return np.concatenate((player_board, opponent_board), axis=1).astype(np.int8)
@@ -1,7 +1,9 @@
 
-from Games.GameLogic import InARowGameSquareBoard
+from Games.GameLogic import InARowGameSquareBoard, GameSpec, get_game_spec, \
+    symmetry_permutations
 import numpy as np
-from Games.GameLogic import bitboard
+from Misc.Kernels import jit_available
+from Games.GameLogic import get_zobrist_table, zobrist_turn_key
 
 
 class ConnectFour(InARowGameSquareBoard):
@@ -9,44 +11,70 @@ class ConnectFour(InARowGameSquareBoard):
     default_kwargs = {
         "rows": 6,
         "columns": 7,
-        "in_a_row_to_win": 4
+        "in_a_row_to_win": 4,
+        # Use bitboards and column heights for moves and win detection.
+        "use_bitboard": False,
+        # Only check the lines through the last played square for a win.
+        "last_move_win_check": False,
+        # Use the compiled kernels for the full board win check (requires Numba).
+        "use_jit": False
     }
 
-    def __init__(self, **kwargs):
-        super().__init__()
-        self.kwargs = self.default_kwargs.copy()
-        self.kwargs.update(kwargs)
-        self.rows = self.kwargs.get("rows")
-        self.columns = self.kwargs.get("columns")
-        self.in_a_row_to_win = self.kwargs.get("in_a_row_to_win")
-
-        self.num_squares = self.columns * self.rows
-        self.board = np.zeros((self.num_squares,), dtype=int)
-        self.fv_size = self.num_squares * 2
-        self.num_actions = self.columns
-        self.in_a_row_to_win = 4
+    __slots__ = ("bitboards", "heights")
 
-        self.kwargs = kwargs
+    def __init__(self, **kwargs):
+        super().__init__(get_game_spec(ConnectFour, kwargs))
+        self.board = np.zeros((self.num_squares,), dtype=np.int8)
+        self.init_features()
+        # A column is legal while its top square is empty.
+        self.legal = np.ones(self.num_actions, dtype=bool)
+
+        # One bitboard per player. Bit (column * (rows + 1) + height) is set when
+        # the player has a piece at that height. The extra bit per column is always empty.
+        self.bitboards = [0, 0]
+        self.heights = [0] * self.columns
+
+    @staticmethod
+    def create_spec(all_kwargs, kwargs):
+        rows = all_kwargs.get("rows")
+        columns = all_kwargs.get("columns")
+        num_squares = columns * rows
+        return GameSpec(
+            name="ConnectFour" + str(rows) + "x" + str(columns),
+            kwargs=kwargs,
+            rows=rows,
+            columns=columns,
+            in_a_row_to_win=4,
+            num_squares=num_squares,
+            num_actions=columns,
+            fv_size=num_squares * 2,
+            use_bitboard=all_kwargs.get("use_bitboard"),
+            last_move_win_check=all_kwargs.get("last_move_win_check"),
+            use_jit=bool(all_kwargs.get("use_jit")) and jit_available,
+            zobrist=get_zobrist_table(num_squares)
+        )
 
-        self.__name__ = "ConnectFour" + str(self.rows) + "x" + str(self.columns)
+    @property
+    def use_bitboard(self):
+        return self.spec.use_bitboard
 
     def new(self):
         return ConnectFour(**self.kwargs)
 
-    def copy(self):
-        board_copy = ConnectFour(**self.kwargs)
-        board_copy.board = self.board.copy()
-        board_copy.winner = self.winner
-        board_copy.turn = self.turn
-        return board_copy
+    def clone(self):
+        c = super().clone()
+        c.bitboards = self.bitboards.copy()
+        c.heights = self.heights.copy()
+        return c
 
     def get_legal_moves(self):
         """ Return a list of the possible action indexes """
         if self.is_game_over():
             return []
-        return np.where(self.board[:self.columns] == 0, 1, 0).nonzero()[0]
+        return np.flatnonzero(self.legal)
 
     def advance(self, a):
+        """ Drop a piece in column a. Return an undo record for undo() """
         if self.winner is not None:
             raise Exception("Cannot advance when game is over")
         if a is None:
@@ -57,55 +85,103 @@ class ConnectFour(InARowGameSquareBoard):
             raise Exception("Action is not legal")
 
         board_value = self.player_index_to_board_value(player_index=self.turn)
+        turn, key = self.turn, self.key
+        if self.use_bitboard:
+            index = self.advance_bitboard(a, board_value)
+            return a, index, turn, key
         # Start from the end because the piece falls down.
         reversed_a = self.columns - a
         while True:
             if self.board[-reversed_a] == 0:
-                self.board[-reversed_a] = board_value
                 break
             else:
                 # This place is take, check the place above next time.
                 reversed_a += self.columns
-        self.update_game_state()
-
-    def update_game_state(self):
-        self.update_in_a_row_game()
+        index = len(self.board) - reversed_a
+        self.set_square(index, board_value)
+        if index < self.columns:
+            self.legal[a] = False
+        self.update_game_state(index)
+        return a, index, turn, key
+
+    def undo(self, record):
+        """ Take back the move given by the undo record from advance() """
+        a, index, turn, key = record
+        self.set_square(index, 0)
+        self.legal[a] = True
+        if self.use_bitboard:
+            a = int(a)
+            self.heights[a] -= 1
+            self.bitboards[turn] &= ~(1 << (a * (self.rows + 1) + self.heights[a]))
+        self.turn = turn
+        self.key = key
+        self.winner = None
+
+    def advance_bitboard(self, a, board_value):
+        """ Drop a piece in column a using the column heights (constant time).
+            Return the board index of the piece. """
+        a = int(a)
+        h = self.heights[a]
+        index = (self.rows - 1 - h) * self.columns + a
+        self.set_square(index, board_value)
+        self.bitboards[self.turn] |= 1 << (a * (self.rows + 1) + h)
+        self.heights[a] = h + 1
+        if h + 1 == self.rows:
+            self.legal[a] = False
+        if self.has_won_bitboard(self.bitboards[self.turn]):
+            self.winner = self.turn
+        self.next_turn()
+        if self.is_draw():
+            self.winner = -1
+        return index
+
+    def has_won_bitboard(self, bb):
+        """ Return True if the bitboard contains in_a_row_to_win pieces in a row.
+            The shifts correspond to the directions | - / and \\. """
+        h = self.rows + 1
+        for shift in (1, h, h - 1, h + 1):
+            m = bb
+            for i in range(1, self.in_a_row_to_win):
+                m &= bb >> (i * shift)
+            if m:
+                return True
+        return False
+
+    def update_game_state(self, index=None):
+        """ index = board index of the last played square """
+        if self.last_move_win_check and index is not None:
+            self.update_in_a_row_game_last_move(index)
+        else:
+            self.update_in_a_row_game()
         self.next_turn()
         # Is the game a draw.
         if self.is_draw():
             self.winner = -1
 
-    def get_augmentations(self, s_array, pi_array, v_array):
-        s_array_new, pi_array_new, v_array_new = [], [], []
+    def get_symmetry_permutations(self):
+        """ Return the board index permutations of the identity and
+            the board mirrored around the middle column """
+        key = ("mirror", self.rows, self.columns)
+        if key not in symmetry_permutations:
+            identity = np.arange(self.num_squares)
+            symmetry_permutations[key] = np.array([identity, self.aug_flip_vertical(identity)])
+        return symmetry_permutations[key]
 
-        # S
-        s_array_new += list(map(lambda x: x, s_array))
-        s_array_new += self.map_add(
-            s_array,
-            self.aug_flip_vertical_s
-        )
+    def get_action_permutations(self):
+        return np.array([np.arange(self.columns), np.arange(self.columns)[::-1]])
 
-        # PI
-        pi_array_new += list(map(lambda x: x, pi_array))
-        pi_array_new += self.map_add(
-            pi_array,
-            lambda x: np.flip(x, 0),
-        )
+    def get_canonical_permutations(self):
+        return self.get_symmetry_permutations(), self.get_action_permutations()
 
-        # V
-        for _ in range(2):
-            v_array_new += v_array
-
-        return s_array_new, pi_array_new, v_array_new
-
-    def get_feature_vector(self):
-        return bitboard(self.board, self.player_index_to_board_value(self.turn))
+    def get_augmentations(self, s_array, pi_array, v_array):
+        return self.get_all_augmentations(s_array, pi_array, v_array)
 
     def next_turn(self):
         """ Next turn is always the other player in this game """
         self.turn += 1
         if self.turn >= self.num_players:
             self.turn = 0
+        self.key ^= zobrist_turn_key
 
     def display(self):
         char_board = ""
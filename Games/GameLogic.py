@@ -1,7 +1,9 @@
 
 from enum import Enum
+from collections import namedtuple
 import numpy as np
 from copy import deepcopy
+from Misc.Kernels import in_a_row_winner
 
 
 def bitboard(board, player_index):
@@ -17,26 +19,274 @@ def bitboard(board, player_index):
     return np.concatenate((player_board, opponent_board))
 
 
+# Cache of Zobrist tables. Key = number of squares (or feature vector size).
+zobrist_tables = {}
+# Zobrist key of the side to move. Toggled every time the turn changes.
+zobrist_turn_key = 0x9E3779B97F4A7C15
+
+
+def get_zobrist_table(size):
+    """ Return a table of random 64-bit keys with shape (size, 3).
+        zobrist_table[index][board_value] is the key of a piece on the board index.
+        Empty squares (board_value 0) have key 0. The table only depends on
+        the size, so keys are equal across game instances and processes. """
+    if size in zobrist_tables:
+        return zobrist_tables[size]
+    random_keys = np.random.RandomState(size).randint(0, 2**63, size=(size, 3), dtype=np.int64)
+    table = [[0, int(k1), int(k2)] for _, k1, k2 in random_keys]
+    zobrist_tables[size] = table
+    return table
+
+
+# Cache of Zobrist tables as numpy arrays. Key = size.
+zobrist_arrays = {}
+
+
+def get_zobrist_array(size):
+    """ Return the Zobrist table of the size as an int64 array with shape (size, 3) """
+    if size not in zobrist_arrays:
+        zobrist_arrays[size] = np.array(get_zobrist_table(size), dtype=np.int64)
+    return zobrist_arrays[size]
+
+
+def compute_zobrist_key(board, turn):
+    """ Compute the Zobrist key of a board from scratch """
+    table = get_zobrist_table(len(board))
+    key = 0
+    for index in np.nonzero(board)[0]:
+        key ^= table[index][board[index]]
+    if turn == 1:
+        key ^= zobrist_turn_key
+    return key
+
+
+def get_feature_vector_key(fv):
+    """ Return a 64-bit Zobrist key of a feature vector (from bitboard) """
+    table = get_zobrist_table(len(fv))
+    key = 0
+    for index in np.nonzero(fv)[0]:
+        key ^= table[index][1]
+    return key
+
+
+# Cache of line tables for in-a-row games. Key = (rows, columns, in_a_row_to_win).
+last_move_line_tables = {}
+
+
+def get_last_move_line_table(rows, columns, in_a_row_to_win):
+    """ Return a list with the board indexes of the four lines ( - | \\ / )
+        through each square. Each line is cut to the squares within
+        in_a_row_to_win - 1 steps of the square, since only these squares
+        can be part of a win that includes the square. """
+    key = (rows, columns, in_a_row_to_win)
+    if key in last_move_line_tables:
+        return last_move_line_tables[key]
+    reach = in_a_row_to_win - 1
+    table = []
+    for i in range(rows):
+        for j in range(columns):
+            lines = []
+            for r, c in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                line = []
+                for step in range(-reach, reach + 1):
+                    i_new, j_new = i + step * r, j + step * c
+                    if 0 <= i_new < rows and 0 <= j_new < columns:
+                        line.append(i_new * columns + j_new)
+                if len(line) >= in_a_row_to_win:
+                    lines.append(np.array(line))
+            table.append(lines)
+    last_move_line_tables[key] = table
+    return table
+
+
+# Static data of a game variant. Shared (and never changed) by all states of the variant.
+GameSpec = namedtuple("GameSpec", [
+    "name", "kwargs", "rows", "columns", "in_a_row_to_win", "num_squares",
+    "num_actions", "fv_size", "use_bitboard", "last_move_win_check", "use_jit", "zobrist"
+])
+
+# Cache of game specs. Key = (game class name, kwargs).
+game_specs = {}
+
+
+def get_game_spec(game_class, kwargs):
+    """ Return the shared GameSpec of a game class with the given kwargs """
+    key = (game_class.__name__, tuple(sorted(kwargs.items())))
+    if key not in game_specs:
+        all_kwargs = game_class.default_kwargs.copy()
+        all_kwargs.update(kwargs)
+        game_specs[key] = game_class.create_spec(all_kwargs, kwargs.copy())
+    return game_specs[key]
+
+
+# Cache of winning lines for in-a-row games. Key = (rows, columns, in_a_row_to_win).
+winning_line_tables = {}
+
+
+def get_winning_lines(rows, columns, in_a_row_to_win):
+    """ Return an int array with shape (num_lines, in_a_row_to_win)
+        containing the board indexes of every possible winning line. """
+    key = (rows, columns, in_a_row_to_win)
+    if key in winning_line_tables:
+        return winning_line_tables[key]
+    lines = []
+    for i in range(rows):
+        for j in range(columns):
+            for r, c in [(0, 1), (1, 0), (1, 1), (1, -1)]:
+                i_end = i + r * (in_a_row_to_win - 1)
+                j_end = j + c * (in_a_row_to_win - 1)
+                if 0 <= i_end < rows and 0 <= j_end < columns:
+                    lines.append([(i + t*r) * columns + j + t*c for t in range(in_a_row_to_win)])
+    lines = np.array(lines, dtype=np.intp).reshape(-1, in_a_row_to_win)
+    winning_line_tables[key] = lines
+    return lines
+
+
+def get_in_a_row_winners(boards, lines):
+    """ Return the board value (1 or 2) of the player that owns a complete
+        line for each board, or 0 if there is no complete line.
+        boards: array with shape (num_squares,) or (N, num_squares).
+        lines: array from get_winning_lines. """
+    values = boards[..., lines]
+    first = values[..., 0]
+    complete = np.all(values == first[..., None], axis=-1) & (first != 0)
+    return np.max(np.where(complete, first, 0), axis=-1)
+
+
+# Cache of symmetry permutations of the board. Key = (rows, columns).
+symmetry_permutations = {}
+
+
+def augment(s_array, pi_array, v_array, s_permutations, pi_permutations):
+    """ Apply the board permutations to all samples at once.
+        The feature vector permutations are applied to both player planes.
+        The result is ordered by permutation, and then by sample. """
+    if len(s_array) == 0:
+        return [], [], []
+    s_block = np.array(s_array)
+    pi_block = np.array(pi_array)
+    num_squares = s_permutations.shape[1]
+    s_new, pi_new = [], []
+    for s_permutation, pi_permutation in zip(s_permutations, pi_permutations):
+        fv_permutation = np.concatenate((s_permutation, s_permutation + num_squares))
+        s_new.append(s_block[:, fv_permutation])
+        pi_new.append(pi_block[:, pi_permutation])
+    s_array_new = list(np.concatenate(s_new))
+    pi_array_new = list(np.concatenate(pi_new))
+    v_array_new = list(v_array) * len(s_permutations)
+    return s_array_new, pi_array_new, v_array_new
+
+
 class BaseGame:
     """ Abstract class used to ensure that games are compatible
         with Expert Iteration algorithms (ExItAlgorithm).
-        Every subclass of Game should be a perfect information game. """
+        Every subclass of Game should be a perfect information game.
+        The static data of the game variant is stored in a shared GameSpec,
+        and each state only stores the fields listed in __slots__. """
+
+    __slots__ = ("spec", "turn", "board", "key", "winner", "features", "feature_views", "legal")
+
+    num_players = 2
+
+    def __init__(self, spec=None):
+        self.spec = spec
 
-    def __init__(self):
         # 0 = player1, 1 = player2. (Index of the winning player).
         self.turn = 0
-        self.num_players = 2
 
         self.board = None
-        self.num_actions = None
-        self.fv_size = None
+
+        # Zobrist key of the board and side to move. Updated incrementally by advance.
+        self.key = 0
 
         # Indicates the winner of the game. (Index of the winning player). (-1 = draw)
         self.winner = None
 
+        # Feature vectors for each side to move. Updated incrementally by set_square.
+        self.features = None
+        self.feature_views = None
+
+        # Bool array (num_actions,) of the actions allowed by the board. Updated incrementally by advance.
+        self.legal = None
+
+    @property
+    def __name__(self):
+        return self.spec.name
+
+    @property
+    def kwargs(self):
+        return self.spec.kwargs
+
+    @property
+    def num_actions(self):
+        return self.spec.num_actions
+
+    @property
+    def fv_size(self):
+        return self.spec.fv_size
+
+    @property
+    def num_squares(self):
+        return self.spec.num_squares
+
+    @property
+    def zobrist(self):
+        return self.spec.zobrist
+
+    @staticmethod
+    def create_spec(all_kwargs, kwargs):
+        """ Return the GameSpec given the kwargs merged with default_kwargs
+            and the kwargs given by the user (used by new) """
+        raise NotImplementedError("Please Implement this method")
+
     def new(self):
         raise NotImplementedError("Please Implement this method")
 
+    def get_key(self):
+        """ Return the 64-bit Zobrist key of the state (including side to move) """
+        return self.key
+
+    def init_features(self):
+        """ Compute the feature vectors of both sides to move from the board.
+            features[0] = bitboard(board, 1), features[1] = bitboard(board, 2). """
+        self.features = np.array([bitboard(self.board, 1), bitboard(self.board, 2)], dtype=np.int8)
+        self.init_feature_views()
+
+    def init_feature_views(self):
+        """ Read-only views of the feature vectors returned by get_feature_vector """
+        view = self.features.view()
+        view.flags.writeable = False
+        self.feature_views = view[0], view[1]
+
+    def __getstate__(self):
+        """ Pickle the fields without the feature views, which must share memory with features """
+        return {
+            name: getattr(self, name) for cls in type(self).__mro__ for name in getattr(cls, "__slots__", ())
+            if name != "feature_views" and hasattr(self, name)
+        }
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+        self.init_feature_views()
+
+    def set_square(self, index, board_value):
+        """ Set the board value of a square and update
+            the Zobrist key and the feature vectors incrementally """
+        n = len(self.board)
+        # Python ints, since int8 index arithmetic overflows on boards with more than 63 squares.
+        old_value = int(self.board[index])
+        board_value = int(board_value)
+        if old_value != 0:
+            self.key ^= self.zobrist[index][old_value]
+            self.features[0, index + (old_value - 1) * n] = 0
+            self.features[1, index + (2 - old_value) * n] = 0
+        if board_value != 0:
+            self.key ^= self.zobrist[index][board_value]
+            self.features[0, index + (board_value - 1) * n] = 1
+            self.features[1, index + (2 - board_value) * n] = 1
+        self.board[index] = board_value
+
     def is_game_over(self):
         return self.winner is not None
 
@@ -59,20 +309,52 @@ class BaseGame:
     def next_turn(self):
         raise NotImplementedError("Please Implement this method")
 
+    def clone(self):
+        """ Return a copy of the state. Only the mutable fields are copied,
+            the spec is shared. Subclasses copy their own fields. """
+        c = object.__new__(type(self))
+        c.spec = self.spec
+        c.turn = self.turn
+        c.board = self.board.copy()
+        c.key = self.key
+        c.winner = self.winner
+        c.features = self.features.copy()
+        c.init_feature_views()
+        c.legal = self.legal.copy()
+        return c
+
     def copy(self):
-        raise NotImplementedError("Please Implement this method")
+        return self.clone()
 
     def get_legal_moves(self):
+        """ Return the legal action indexes in increasing order """
         raise NotImplementedError("Please Implement this method")
 
+    def legal_mask(self):
+        """ Return a bool array (num_actions,) that is True for the legal actions.
+            The returned array changes when the state changes, so it must not be
+            modified and must be copied before it is stored. """
+        if self.is_game_over():
+            return np.zeros(self.num_actions, dtype=bool)
+        return self.legal
+
     def advance(self, a):
+        """ Advance the game with action a.
+            Return an undo record that can be given to undo(). """
+        raise NotImplementedError("Please Implement this method")
+
+    def undo(self, record):
+        """ Restore the state before the advance() that returned the record """
         raise NotImplementedError("Please Implement this method")
 
     def update_game_state(self):
         raise NotImplementedError("Please Implement this method")
 
     def get_feature_vector(self):
-        raise NotImplementedError("Please Implement this method")
+        """ Return the feature vector of the side to move (bitboard of the board).
+            The returned array is a read-only view that changes when the state
+            changes, so it must be copied before it is stored. """
+        return self.feature_views[self.turn]
 
     def display(self):
         raise NotImplementedError("Please Implement this method")
@@ -105,10 +387,15 @@ class BaseGameSquareBoard(BaseGame):
         (1, -1), (1, 0), (1, 1)
     ]
 
-    def __init__(self):
-        super().__init__()
-        self.rows = None
-        self.columns = None
+    __slots__ = ()
+
+    @property
+    def rows(self):
+        return self.spec.rows
+
+    @property
+    def columns(self):
+        return self.spec.columns
 
     def is_inside_board(self, i, j):
         return 0 <= i < self.rows and 0 <= j < self.columns
@@ -175,56 +462,107 @@ class BaseGameSquareBoard(BaseGame):
     def aug_flip_vertical_s(self, s):
         return self.__s_function(s, self.aug_flip_vertical)
 
-    def get_all_augmentations(self, s_array, pi_array, v_array):
-
-        s_array_new, pi_array_new, v_array_new = [], [], []
-
-        # S
-        s_array_new += list(map(lambda x : x, s_array))
-        s_array_new += self.map_add(
-            s_array,
-            self.aug_rotate_90_s,
-            self.aug_rotate_180_s,
-            self.aug_rotate_270_s
-        )
-        s_array_transposed = list(map(self.transpose_s, s_array))
-        s_array_new += s_array_transposed.copy()
-        s_array_new += self.map_add(
-            s_array_transposed,
-            self.aug_rotate_90_s,
-            self.aug_rotate_180_s,
-            self.aug_rotate_270_s
+    def get_symmetry_permutations(self):
+        """ Return an int array (8, num_squares) with the board index permutation
+            of each augmentation in get_all_augmentations: the rotations by
+            0, 90, 180 and 270 degrees, followed by the same rotations of the
+            transposed board. Computed once per board shape. """
+        key = (self.rows, self.columns)
+        if key not in symmetry_permutations:
+            identity = np.arange(self.rows * self.columns)
+            transposed = self.transpose_array(identity)
+            permutations = [self.rotate_90(identity, k) for k in range(4)]
+            permutations += [transposed[self.rotate_90(identity, k)] for k in range(4)]
+            symmetry_permutations[key] = np.array(permutations)
+        return symmetry_permutations[key]
+
+    def get_action_permutations(self):
+        """ Return the action index permutation of each symmetry permutation """
+        return self.get_symmetry_permutations()
+
+    # Canonical states.
+
+    def get_canonical_permutations(self):
+        """ Return (board permutations, action permutations) of the symmetries
+            of the board. Square boards have 8 symmetries, other boards have 4. """
+        if self.rows == self.columns:
+            return self.get_symmetry_permutations(), self.get_action_permutations()
+        key = ("rectangle", self.rows, self.columns)
+        if key not in symmetry_permutations:
+            identity = np.arange(self.rows * self.columns)
+            symmetry_permutations[key] = np.array([
+                identity,
+                self.rotate_90(identity, 2),
+                self.aug_flip_horizontal(identity),
+                self.aug_flip_vertical(identity)
+            ])
+        return symmetry_permutations[key], symmetry_permutations[key]
+
+    def get_canonical_key(self):
+        """ Return (canonical key, t). The canonical key is the smallest Zobrist key
+            of the symmetric states (including side to move), and t is the index
+            of the transformation that gives this state. Symmetric states have
+            the same canonical key. """
+        permutations, _ = self.get_canonical_permutations()
+        table = get_zobrist_array(self.num_squares)
+        keys = np.bitwise_xor.reduce(
+            table[np.arange(self.num_squares), self.board[permutations]], axis=1
         )
+        t = int(np.argmin(keys))
+        key = int(keys[t])
+        if self.turn == 1:
+            key ^= zobrist_turn_key
+        return key, t
+
+    def to_canonical_pi(self, pi, t):
+        """ Map action values of this state to the canonical state of transformation t """
+        _, action_permutations = self.get_canonical_permutations()
+        return np.asarray(pi)[action_permutations[t]]
+
+    def from_canonical_pi(self, pi, t):
+        """ Map action values of the canonical state of transformation t back to this state """
+        _, action_permutations = self.get_canonical_permutations()
+        pi_new = np.empty(len(pi))
+        pi_new[action_permutations[t]] = pi
+        return pi_new
+
+    def get_canonical_sample(self, s, pi):
+        """ Return (key, s, pi) of the canonical form of a sample, where s is a
+            feature vector and pi the action values of the sample.
+            The key is equal to get_feature_vector_key of the returned s. """
+        permutations, action_permutations = self.get_canonical_permutations()
+        s = np.asarray(s)
+        fv_permutations = np.concatenate((permutations, permutations + self.num_squares), axis=1)
+        table = get_zobrist_array(len(s))[:, 1]
+        keys = np.bitwise_xor.reduce(np.where(s[fv_permutations] != 0, table, 0), axis=1)
+        t = int(np.argmin(keys))
+        return int(keys[t]), s[fv_permutations[t]], np.asarray(pi)[action_permutations[t]]
 
-        # PI
-        pi_array_new += list(map(lambda x : x, pi_array))
-        pi_array_new += self.map_add(
-            pi_array,
-            self.aug_rotate_90,
-            self.aug_rotate_180,
-            self.aug_rotate_270
-        )
-        pi_array_transposed = list(map(self.transpose_array, pi_array))
-        pi_array_new += pi_array_transposed.copy()
-        pi_array_new += self.map_add(
-            pi_array_transposed,
-            self.aug_rotate_90,
-            self.aug_rotate_180,
-            self.aug_rotate_270
+    def get_all_augmentations(self, s_array, pi_array, v_array):
+        return augment(
+            s_array, pi_array, v_array,
+            self.get_symmetry_permutations(),
+            self.get_action_permutations()
         )
 
-        # V
-        for _ in range(8):
-            v_array_new += v_array
 
-        return s_array_new, pi_array_new, v_array_new
+class InARowGameSquareBoard(BaseGameSquareBoard):
 
+    __slots__ = ()
 
-class InARowGameSquareBoard(BaseGameSquareBoard):
+    @property
+    def in_a_row_to_win(self):
+        return self.spec.in_a_row_to_win
 
-    def __init__(self):
-        super().__init__()
-        self.in_a_row_to_win = None
+    @property
+    def last_move_win_check(self):
+        """ Only check the lines through the last played square """
+        return self.spec.last_move_win_check
+
+    @property
+    def use_jit(self):
+        """ Use the compiled kernels of Misc.Kernels (False if Numba is not installed) """
+        return self.spec.use_jit
 
     def check_in_a_row(self, r):
         counter = 0
@@ -248,37 +586,26 @@ class InARowGameSquareBoard(BaseGameSquareBoard):
                 last = c
                 counter = 1
 
-    def check_horizontal(self, board):
-        for r in board:
-            self.check_in_a_row(r)
-
-    def check_diagonal(self, board, column_count, row_count):
-        diagonals = [board.diagonal()]
-        """ -> """
-        for i in range(1, row_count - self.in_a_row_to_win + 1):
-            diagonals.append(board.diagonal(offset=i))
-        """ |
-            V """
-        for i in range(1, column_count - self.in_a_row_to_win + 1):
-            diagonals.append(board.diagonal(offset=-i))
-
-        for d in diagonals:
-            self.check_in_a_row(d)
-
     def update_in_a_row_game(self):
-        # Convert board to matrix.
-        board = np.reshape(self.board, (-1, self.columns))
-        # Horizontal "-"
-        self.check_horizontal(board)
-        # Vertical "|"
-        board = np.transpose(board)
-        self.check_horizontal(board)
-        # NB: Board is still transposed, but this does not matter for the checks below.
-        # Diagonal "\"
-        self.check_diagonal(board, column_count=self.columns, row_count=self.rows)
-        # Diagonal "/"
-        board = np.rot90(board)
-        self.check_diagonal(board, column_count=self.rows, row_count=self.columns)
+        if self.use_jit:
+            board_value = in_a_row_winner(self.board, self.rows, self.columns, self.in_a_row_to_win)
+        else:
+            # Gather every winning line of the board and reduce (see get_winning_lines).
+            board_value = get_in_a_row_winners(self.board, self.get_winning_lines())
+        if board_value != 0:
+            self.winner = self.board_value_to_player_index(board_value)
+
+    def get_winning_lines(self):
+        return get_winning_lines(self.rows, self.columns, self.in_a_row_to_win)
+
+    def update_in_a_row_game_last_move(self, index):
+        """ Check only the lines through the square that was just played.
+            The cost is proportional to in_a_row_to_win instead of the board size. """
+        table = get_last_move_line_table(self.rows, self.columns, self.in_a_row_to_win)
+        for line in table[index]:
+            self.check_in_a_row(self.board[line])
+            if self.winner is not None:
+                return
 
 
 class GameResult(Enum):
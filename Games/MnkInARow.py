@@ -1,7 +1,8 @@
 
-from Games.GameLogic import InARowGameSquareBoard
+from Games.GameLogic import InARowGameSquareBoard, GameSpec, get_game_spec
 import numpy as np
-from Games.GameLogic import bitboard
+from Misc.Kernels import jit_available
+from Games.GameLogic import get_zobrist_table, zobrist_turn_key
 
 
 class MnkInARow(InARowGameSquareBoard):
@@ -9,51 +10,62 @@ class MnkInARow(InARowGameSquareBoard):
     default_kwargs = {
         "rows": 10,
         "columns": 10,
-        "in_a_row_to_win": 6
+        "in_a_row_to_win": 6,
+        # Only check the lines through the last played square for a win.
+        "last_move_win_check": False,
+        # Use the compiled kernels for the full board win check (requires Numba).
+        "use_jit": False
     }
 
+    __slots__ = ()
+
     def __init__(self, **kwargs):
-        super().__init__()
-        self.kwargs = self.default_kwargs.copy()
-        self.kwargs.update(kwargs)
-        self.rows = self.kwargs.get("rows")
-        self.columns = self.kwargs.get("columns")
-        self.in_a_row_to_win = self.kwargs.get("in_a_row_to_win")
-
-        self.num_squares = self.columns * self.rows
-        self.board = np.zeros((self.num_squares,), dtype=int)
-        self.fv_size = self.num_squares * 2
-        self.num_actions = self.num_squares
-
-        self.kwargs = kwargs
-
-        self.__name__ = "MnkInARow" + str(self.rows) + "x" + str(self.columns) + "_" \
-                        + str(self.in_a_row_to_win)
-
-        if (self.rows, self.columns, self.in_a_row_to_win) == (3, 3, 3):
-            self.__name__ = "TicTacToe"
-        elif self.in_a_row_to_win == 6:
-            self.__name__ = "ConnectSix" + str(self.rows) + "x" + str(self.columns)
-        elif self.in_a_row_to_win == 5:
-            self.__name__ = "Gomoku" + str(self.rows) + "x" + str(self.columns)
+        super().__init__(get_game_spec(MnkInARow, kwargs))
+        self.board = np.zeros((self.num_squares,), dtype=np.int8)
+        self.init_features()
+        self.legal = np.ones(self.num_actions, dtype=bool)
+
+    @staticmethod
+    def create_spec(all_kwargs, kwargs):
+        rows = all_kwargs.get("rows")
+        columns = all_kwargs.get("columns")
+        in_a_row_to_win = all_kwargs.get("in_a_row_to_win")
+        num_squares = columns * rows
+
+        name = "MnkInARow" + str(rows) + "x" + str(columns) + "_" + str(in_a_row_to_win)
+        if (rows, columns, in_a_row_to_win) == (3, 3, 3):
+            name = "TicTacToe"
+        elif in_a_row_to_win == 6:
+            name = "ConnectSix" + str(rows) + "x" + str(columns)
+        elif in_a_row_to_win == 5:
+            name = "Gomoku" + str(rows) + "x" + str(columns)
+
+        return GameSpec(
+            name=name,
+            kwargs=kwargs,
+            rows=rows,
+            columns=columns,
+            in_a_row_to_win=in_a_row_to_win,
+            num_squares=num_squares,
+            num_actions=num_squares,
+            fv_size=num_squares * 2,
+            use_bitboard=False,
+            last_move_win_check=all_kwargs.get("last_move_win_check"),
+            use_jit=bool(all_kwargs.get("use_jit")) and jit_available,
+            zobrist=get_zobrist_table(num_squares)
+        )
 
     def new(self):
         return MnkInARow(**self.kwargs)
 
-    def copy(self):
-        board_copy = MnkInARow(**self.kwargs)
-        board_copy.board = self.board.copy()
-        board_copy.winner = self.winner
-        board_copy.turn = self.turn
-        return board_copy
-
     def get_legal_moves(self):
         """ Return a list of the possible action indexes """
         if self.is_game_over():
             return []
-        return np.where(self.board[:self.num_actions] == 0, 1, 0).nonzero()[0]
+        return np.flatnonzero(self.legal)
 
     def advance(self, a):
+        """ Place a piece on square a. Return an undo record for undo() """
         if self.winner is not None:
             raise Exception("Cannot advance when game is over")
         if a is None:
@@ -63,12 +75,28 @@ class MnkInARow(InARowGameSquareBoard):
         if a >= self.num_actions or a < 0:
             raise Exception("Action is not legal")
 
+        record = a, self.turn, self.key
         board_value = self.player_index_to_board_value(player_index=self.turn)
-        self.board[a] = board_value
-        self.update_game_state()
-
-    def update_game_state(self):
-        self.update_in_a_row_game()
+        self.set_square(a, board_value)
+        self.legal[a] = False
+        self.update_game_state(a)
+        return record
+
+    def undo(self, record):
+        """ Take back the move given by the undo record from advance() """
+        a, turn, key = record
+        self.set_square(a, 0)
+        self.legal[a] = True
+        self.turn = turn
+        self.key = key
+        self.winner = None
+
+    def update_game_state(self, index=None):
+        """ index = board index of the last played square """
+        if self.last_move_win_check and index is not None:
+            self.update_in_a_row_game_last_move(index)
+        else:
+            self.update_in_a_row_game()
         self.next_turn()
         # Is the game a draw.
         if self.is_draw():
@@ -77,14 +105,12 @@ class MnkInARow(InARowGameSquareBoard):
     def get_augmentations(self, s_array, pi_array, v_array):
         return self.get_all_augmentations(s_array, pi_array, v_array)
 
-    def get_feature_vector(self):
-        return bitboard(self.board, self.player_index_to_board_value(self.turn))
-
     def next_turn(self):
         """ Next turn is always the other player in this game """
         self.turn += 1
         if self.turn >= self.num_players:
             self.turn = 0
+        self.key ^= zobrist_turn_key
 
     def display(self):
         char_board = ""
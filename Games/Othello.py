@@ -1,44 +1,128 @@
 
-from Games.GameLogic import BaseGameSquareBoard
+from Games.GameLogic import BaseGameSquareBoard, GameSpec, get_game_spec
 import numpy as np
-from Games.GameLogic import bitboard
+from Misc.Kernels import jit_available, othello_legal_mask, othello_flips
+from Games.GameLogic import get_zobrist_table, zobrist_turn_key, \
+    compute_zobrist_key
 from copy import deepcopy
 
 
+# Cache of (shift, mask) pairs for the 8 directions. Key = (rows, columns).
+shift_masks = {}
+
+
+def get_shift_masks(rows, columns):
+    """ Return a list of (shift, mask) for each direction. Bit (i * columns + j)
+        represents square (i, j). The mask removes bits that are shifted outside
+        of the board or wrap around to another row. """
+    key = (rows, columns)
+    if key in shift_masks:
+        return shift_masks[key]
+    full = (1 << (rows * columns)) - 1
+    not_first_column, not_last_column = 0, 0
+    for i in range(rows):
+        for j in range(columns):
+            if j != 0:
+                not_first_column |= 1 << (i * columns + j)
+            if j != columns - 1:
+                not_last_column |= 1 << (i * columns + j)
+    masks = []
+    for r, c in BaseGameSquareBoard.directions:
+        mask = full
+        if c == 1:
+            mask &= not_first_column
+        if c == -1:
+            mask &= not_last_column
+        masks.append((r * columns + c, mask))
+    shift_masks[key] = masks
+    return masks
+
+
+def shift(x, s, mask):
+    """ Shift all pieces in x one step in the direction given by (s, mask) """
+    if s > 0:
+        return (x << s) & mask
+    return (x >> -s) & mask
+
+
+def bit_indexes(x):
+    """ Return the indexes of the bits that are set in x """
+    indexes = []
+    while x:
+        low = x & -x
+        indexes.append(low.bit_length() - 1)
+        x ^= low
+    return indexes
+
+
+def pop_count(x):
+    return bin(x).count("1")
+
+
 class Othello(BaseGameSquareBoard):
 
     default_kwargs = {
         "rows": 8,
-        "columns": 8
+        "columns": 8,
+        # Use bitboards for move generation and flipping.
+        "use_bitboard": False,
+        # Use the compiled kernels for move generation and flipping (requires Numba).
+        "use_jit": False
     }
 
+    __slots__ = ("bitboards", "move_cache")
+
     def __init__(self, **kwargs):
-        super().__init__()
-        self.kwargs = self.default_kwargs.copy()
-        self.kwargs.update(kwargs)
-        self.rows = self.kwargs.get("rows")
-        self.columns = self.kwargs.get("columns")
-
-        self.num_squares = self.columns * self.rows
-        self.board = np.zeros((self.num_squares,), dtype=int)
-        self.fv_size = self.num_squares * 2
-        self.num_actions = self.num_squares
-        self.turn = 0
+        super().__init__(get_game_spec(Othello, kwargs))
+        self.board = np.zeros((self.num_squares,), dtype=np.int8)
+
+        # One bitboard per player index. Bit (i * columns + j) represents square (i, j).
+        self.bitboards = [0, 0]
+        # Legal moves of the current position: {turn: {action: flips}}.
+        self.move_cache = {}
 
         self.place_initial_pieces()
-        self.kwargs = kwargs
+        self.key = compute_zobrist_key(self.board, self.turn)
+        self.init_features()
+        self.set_legal_mask(self.get_legal_moves_2(self.turn))
 
-        self.__name__ = "Othello" + str(self.rows) + "x" + str(self.columns)
+    @staticmethod
+    def create_spec(all_kwargs, kwargs):
+        rows = all_kwargs.get("rows")
+        columns = all_kwargs.get("columns")
+        num_squares = columns * rows
+        return GameSpec(
+            name="Othello" + str(rows) + "x" + str(columns),
+            kwargs=kwargs,
+            rows=rows,
+            columns=columns,
+            in_a_row_to_win=None,
+            num_squares=num_squares,
+            num_actions=num_squares,
+            fv_size=num_squares * 2,
+            use_bitboard=all_kwargs.get("use_bitboard"),
+            last_move_win_check=False,
+            use_jit=bool(all_kwargs.get("use_jit")) and jit_available,
+            zobrist=get_zobrist_table(num_squares)
+        )
+
+    @property
+    def use_bitboard(self):
+        return self.spec.use_bitboard
+
+    @property
+    def use_jit(self):
+        """ Use the compiled kernels of Misc.Kernels (False if Numba is not installed) """
+        return self.spec.use_jit
 
     def new(self):
         return Othello(**self.kwargs)
 
-    def copy(self):
-        board_copy = Othello(**self.kwargs)
-        board_copy.board = self.board.copy()
-        board_copy.winner = self.winner
-        board_copy.turn = self.turn
-        return board_copy
+    def clone(self):
+        c = super().clone()
+        c.bitboards = self.bitboards.copy()
+        c.move_cache = self.move_cache.copy()
+        return c
 
     def place_initial_pieces(self):
         r = int(self.rows / 2) - 1
@@ -47,14 +131,27 @@ class Othello(BaseGameSquareBoard):
         self.board[self.get_board_index(r, c+1)] = 2
         self.board[self.get_board_index(r+1, c)] = 2
         self.board[self.get_board_index(r+1, c+1)] = 1
+        if self.use_bitboard:
+            self.bitboards = [
+                sum(1 << int(i) for i in np.nonzero(self.board == 1)[0]),
+                sum(1 << int(i) for i in np.nonzero(self.board == 2)[0])
+            ]
 
     def get_legal_moves(self):
-        return self.get_legal_moves_2(self.turn)
+        """ Return the legal moves of the side to move from the legal mask """
+        if self.is_game_over():
+            return []
+        return np.flatnonzero(self.legal)
 
     def get_legal_moves_2(self, turn):
-        """ Return a list of the possible action indexes """
+        """ Generate the possible action indexes of the given turn from the board """
         if self.is_game_over():
             return []
+        if self.use_bitboard:
+            return np.array(sorted(self.get_moves_bitboard(turn)), dtype=int)
+        if self.use_jit:
+            color = self.player_index_to_board_value(turn)
+            return np.flatnonzero(othello_legal_mask(self.board, self.rows, self.columns, color))
 
         legal_actions = []
         for i in range(self.rows):
@@ -67,8 +164,50 @@ class Othello(BaseGameSquareBoard):
                     # Check all directions.
                     if self.piece_check_direction(i, j, d, turn=turn):
                         legal_actions.append(i * self.columns + j)
-        legal_actions = list(set(legal_actions))
-        return np.array(legal_actions)
+        legal_actions = sorted(set(legal_actions))
+        return np.array(legal_actions, dtype=int)
+
+    def set_legal_mask(self, moves):
+        """ The legal mask is replaced (not changed) when the side to move changes,
+            so undo records can share it """
+        self.legal = np.zeros(self.num_actions, dtype=bool)
+        self.legal[moves] = True
+
+    def get_moves_bitboard(self, turn):
+        """ Return {action: flips} for the given turn, where flips is the bitboard
+            of the pieces flipped by the action. Generated once per position. """
+        if turn in self.move_cache:
+            return self.move_cache[turn]
+        player = self.bitboards[turn]
+        opponent = self.bitboards[Othello.other_turn(turn)]
+        empty = ~(player | opponent) & ((1 << self.num_squares) - 1)
+        masks = get_shift_masks(self.rows, self.columns)
+
+        # Shift the player's pieces over runs of opponent pieces in all directions.
+        moves = 0
+        for s, mask in masks:
+            x = shift(player, s, mask) & opponent
+            for _ in range(max(self.rows, self.columns) - 3):
+                x |= shift(x, s, mask) & opponent
+            moves |= shift(x, s, mask) & empty
+
+        # Find the flipped pieces for each legal move.
+        moves_flips = {}
+        for a in bit_indexes(moves):
+            move = 1 << a
+            flips = 0
+            for s, mask in masks:
+                f = 0
+                x = shift(move, s, mask)
+                while x & opponent:
+                    f |= x
+                    x = shift(x, s, mask)
+                if x & player:
+                    flips |= f
+            moves_flips[a] = flips
+
+        self.move_cache[turn] = moves_flips
+        return moves_flips
 
     def piece_check_direction(self, i, j, d, turn):
         color = self.player_index_to_board_value(turn)
@@ -93,6 +232,7 @@ class Othello(BaseGameSquareBoard):
         return False
 
     def advance(self, a):
+        """ Place a piece on square a and flip pieces. Return an undo record for undo() """
         if self.winner is not None:
             raise Exception("Cannot advance when game is over")
         if a is None:
@@ -101,37 +241,86 @@ class Othello(BaseGameSquareBoard):
             raise Exception("This column is full")
         if a >= self.num_actions or a < 0:
             raise Exception("Action is not legal")
-        if a not in self.get_legal_moves():
+        turn, bitboards, move_cache, key = self.turn, tuple(self.bitboards), self.move_cache, self.key
+        legal = self.legal
+        if self.use_bitboard:
+            flipped = self.advance_bitboard(int(a))
+            return a, flipped, turn, bitboards, move_cache, legal, key
+        if not self.legal[a]:
+            raise Exception("Action is not legal according to get_legal_moves function")
+
+        board_value = self.player_index_to_board_value(player_index=self.turn)
+        self.set_square(a, board_value)
+        flipped = self.update_game_state(a)
+        return a, flipped, turn, bitboards, move_cache, legal, key
+
+    def undo(self, record):
+        """ Take back the move given by the undo record from advance() """
+        a, flipped, turn, bitboards, move_cache, legal, key = record
+        self.set_square(a, 0)
+        opponent_value = self.player_index_to_board_value(Othello.other_turn(turn))
+        for i in flipped:
+            self.set_square(i, opponent_value)
+        self.bitboards = list(bitboards)
+        self.move_cache = move_cache
+        self.legal = legal
+        self.turn = turn
+        self.key = key
+        self.winner = None
+
+    def advance_bitboard(self, a):
+        """ Place a piece and flip using the flips found by get_moves_bitboard.
+            Return the indexes of the flipped pieces. """
+        moves_flips = self.get_moves_bitboard(self.turn)
+        if a not in moves_flips:
             raise Exception("Action is not legal according to get_legal_moves function")
+        flips = moves_flips[a]
+        self.bitboards[self.turn] |= flips | (1 << a)
+        self.bitboards[Othello.other_turn(self.turn)] &= ~flips
 
         board_value = self.player_index_to_board_value(player_index=self.turn)
-        self.board[a] = board_value
-        self.update_game_state(a)
+        self.set_square(a, board_value)
+        flipped = bit_indexes(flips)
+        for i in flipped:
+            self.set_square(i, board_value)
+
+        self.move_cache = {}
+        self.next_turn()
+        if self.is_draw():
+            self.winner = -1
+        return flipped
 
     def update_game_state(self, a):
+        """ Flip pieces and return the indexes of the flipped pieces """
         i = int(a / self.columns)
         j = a % self.columns
         color = self.get_board_square(i, j)
 
-        for d in self.directions:
-            r, c = d
-            i_new, j_new = i + r, j + c
-            if self.piece_check_direction(i, j, d, turn=self.turn):
-                while not self.board[self.get_board_index(i_new, j_new)] == color:
-                    self.board[self.get_board_index(i_new, j_new)] = color
-                    i_new, j_new = i_new + r, j_new + c
+        if self.use_jit:
+            flipped = [int(x) for x in othello_flips(self.board, self.rows, self.columns, int(a), color)]
+            for index in flipped:
+                self.set_square(index, color)
+        else:
+            flipped = []
+            for d in self.directions:
+                r, c = d
+                i_new, j_new = i + r, j + c
+                if self.piece_check_direction(i, j, d, turn=self.turn):
+                    while not self.board[self.get_board_index(i_new, j_new)] == color:
+                        index = self.get_board_index(i_new, j_new)
+                        self.set_square(index, color)
+                        flipped.append(index)
+                        i_new, j_new = i_new + r, j_new + c
 
         self.next_turn()
 
         if self.is_draw():
             self.winner = -1
+        return flipped
 
     def get_augmentations(self, s_array, pi_array, v_array):
         return self.get_all_augmentations(s_array, pi_array, v_array)
 
-    def get_feature_vector(self):
-        return bitboard(self.board, self.player_index_to_board_value(self.turn))
-
     def is_draw(self):
         if self.winner == -1:
             return True
@@ -139,8 +328,7 @@ class Othello(BaseGameSquareBoard):
             return False
         # This must be reimplemented if a player can skip a move.
         # This should then be tested for each player.
-        count_0 = len([x for x in self.board if x == 1])
-        count_1 = len([x for x in self.board if x == 2])
+        count_0, count_1 = self.count_pieces()
         return len(self.get_legal_moves_2(self.turn)) == 0 and \
                len(self.get_legal_moves_2(Othello.other_turn(self.turn))) == 0 and \
                count_0 == count_1
@@ -153,18 +341,30 @@ class Othello(BaseGameSquareBoard):
         self.turn += 1
         if self.turn >= self.num_players:
             self.turn = 0
+        self.key ^= zobrist_turn_key
 
-        if len(self.get_legal_moves()) == 0:
+        moves = self.get_legal_moves_2(self.turn)
+        if len(moves) == 0:
             self.turn += 1
             if self.turn >= self.num_players:
                 self.turn = 0
-            if len(self.get_legal_moves()) == 0:
+            self.key ^= zobrist_turn_key
+            moves = self.get_legal_moves_2(self.turn)
+            if len(moves) == 0:
                 # GAME STOPS. Declare winner.
                 self.declare_winner()
+        self.set_legal_mask(moves)
 
-    def declare_winner(self):
+    def count_pieces(self):
+        """ Return the number of pieces of each player """
+        if self.use_bitboard:
+            return pop_count(self.bitboards[0]), pop_count(self.bitboards[1])
         count_0 = len([x for x in self.board if x == 1])
         count_1 = len([x for x in self.board if x == 2])
+        return count_0, count_1
+
+    def declare_winner(self):
+        count_0, count_1 = self.count_pieces()
         if count_0 == count_1:
             self.winner = -1
         if count_0 > count_1:
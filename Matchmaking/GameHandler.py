@@ -61,8 +61,7 @@ class GameHandler:
             player = self.players[state.turn]
             p, v = None, None
             if isinstance(player, BaseExItPlayer):
-                p = player.ex_it_algorithm.apprentice.pred_pi(state.get_feature_vector())
-                v = player.ex_it_algorithm.apprentice.pred_v(state.get_feature_vector())
+                p, v = player.ex_it_algorithm.apprentice.predict_state(state)
             if random.uniform(0, 1) < self.randomness:
                 a = self.players[state.turn].move_random(state)
             else:
@@ -0,0 +1,200 @@
+from Games.ConnectFour import ConnectFour
+from Games.MnkInARow import MnkInARow
+from Games.Othello import Othello
+from Misc.Kernels import jit_available
+from ExIt.Apprentice.Heuristic import Heuristic
+from ExIt.Expert.Minimax import Minimax
+from ExIt.Expert.Mcts import Mcts
+from time import perf_counter
+from datetime import datetime
+import numpy as np
+import platform
+import argparse
+import random
+import json
+
+
+""" Benchmarks of the rules engines of the games.
+    Perft counts the number of move sequences of a given length from the initial
+    state (game over states before the given depth are not counted).
+    The "jit" backends use the compiled kernels of Misc.Kernels and are equal
+    to the "default" backends when Numba is not installed.
+    Run with: python -m Misc.Benchmark --output bench.json """
+
+
+# Perft node counts from the initial state. Key = game name, index = depth - 1.
+perft_reference = {
+    "TicTacToe": [9, 72, 504, 3024, 15120, 54720, 148176, 200448, 127872],
+    "MnkInARow5x5_4": [25, 600, 13800, 303600, 6375600],
+    "ConnectSix10x10": [100, 9900, 970200],
+    "ConnectFour6x7": [7, 49, 343, 2401, 16807, 117649, 823536],
+    "Othello8x8": [4, 12, 56, 244, 1396, 8200, 55092, 390216]
+}
+
+# (backend name, game, default perft depth).
+benchmark_games = [
+    ("default", MnkInARow(rows=3, columns=3, in_a_row_to_win=3), 6),
+    ("last_move", MnkInARow(rows=3, columns=3, in_a_row_to_win=3, last_move_win_check=True), 6),
+    ("jit", MnkInARow(rows=3, columns=3, in_a_row_to_win=3, use_jit=True), 6),
+    ("default", MnkInARow(rows=5, columns=5, in_a_row_to_win=4), 3),
+    ("last_move", MnkInARow(rows=5, columns=5, in_a_row_to_win=4, last_move_win_check=True), 3),
+    ("jit", MnkInARow(rows=5, columns=5, in_a_row_to_win=4, use_jit=True), 3),
+    ("default", MnkInARow(rows=10, columns=10, in_a_row_to_win=6), 2),
+    ("last_move", MnkInARow(rows=10, columns=10, in_a_row_to_win=6, last_move_win_check=True), 2),
+    ("jit", MnkInARow(rows=10, columns=10, in_a_row_to_win=6, use_jit=True), 2),
+    ("default", ConnectFour(), 4),
+    ("last_move", ConnectFour(last_move_win_check=True), 4),
+    ("bitboard", ConnectFour(use_bitboard=True), 4),
+    ("jit", ConnectFour(use_jit=True), 4),
+    ("default", Othello(), 3),
+    ("jit", Othello(use_jit=True), 4),
+    ("bitboard", Othello(use_bitboard=True), 4)
+]
+
+
+def perft(state, depth):
+    """ Return the number of move sequences of length depth from the state """
+    if depth == 0:
+        return 1
+    if state.is_game_over():
+        return 0
+    nodes = 0
+    for a in state.get_legal_moves():
+        record = state.advance(a)
+        nodes += perft(state, depth - 1)
+        state.undo(record)
+    return nodes
+
+
+def benchmark_perft(game, max_depth):
+    """ Return the perft results for depth 1 to max_depth """
+    reference = perft_reference.get(game.__name__, [])
+    results = []
+    for depth in range(1, max_depth + 1):
+        state = game.new()
+        start = perf_counter()
+        nodes = perft(state, depth)
+        seconds = perf_counter() - start
+        expected = reference[depth - 1] if depth <= len(reference) else None
+        results.append({
+            "depth": depth,
+            "nodes": nodes,
+            "expected": expected,
+            "correct": None if expected is None else nodes == expected,
+            "seconds": seconds,
+            "nodes_per_second": nodes / seconds if seconds > 0 else None
+        })
+    return results
+
+
+def sample_states(game, num_states, seed):
+    """ Return states (not game over) from random games """
+    rnd = random.Random(seed)
+    states = []
+    while len(states) < num_states:
+        state = game.new()
+        while not state.is_game_over() and len(states) < num_states:
+            states.append(state.copy())
+            state.advance(rnd.choice(list(state.get_legal_moves())))
+    return states
+
+
+def time_per_call(function, arguments, repeat):
+    """ Return the average time in seconds of function(argument) """
+    start = perf_counter()
+    for _ in range(repeat):
+        for argument in arguments:
+            function(argument)
+    return (perf_counter() - start) / (repeat * len(arguments))
+
+
+def benchmark_calls(game, num_states=200, repeat=5, seed=0):
+    """ Return the average time per call of the game functions used by the search """
+    states = sample_states(game, num_states, seed)
+    rnd = random.Random(seed)
+    actions = [rnd.choice(list(s.get_legal_moves())) for s in states]
+
+    # Advance changes the state, so every call gets a fresh copy.
+    copies = [(s.copy(), a) for _ in range(repeat) for s, a in zip(states, actions)]
+    advance = time_per_call(lambda x: x[0].advance(x[1]), copies, 1)
+
+    s_array = [s.get_feature_vector() for s in states[:30]]
+    pi_array = [np.full(game.num_actions, 1 / game.num_actions) for _ in s_array]
+    v_array = [0.0 for _ in s_array]
+
+    return {
+        "advance": advance,
+        "get_legal_moves": time_per_call(lambda s: s.get_legal_moves(), states, repeat),
+        "legal_mask": time_per_call(lambda s: s.legal_mask(), states, repeat),
+        "get_feature_vector": time_per_call(lambda s: s.get_feature_vector(), states, repeat),
+        "copy": time_per_call(lambda s: s.copy(), states, repeat),
+        "is_game_over": time_per_call(lambda s: s.is_game_over(), states, repeat),
+        "get_augmentations": time_per_call(
+            lambda _: game.get_augmentations(s_array, pi_array, v_array), [None], repeat
+        )
+    }
+
+
+def benchmark_search(game, depth=1, num_states=10, seed=0):
+    """ Return the average time per move of a fixed depth Minimax search
+        that evaluates the leaves with the Heuristic apprentice (no neural network) """
+    states = sample_states(game, num_states, seed)
+    minimax = Minimax(fixed_depth=depth)
+    predictor = Heuristic(game, seed=seed)
+    return time_per_call(lambda s: minimax.search(s, predictor, always_exploit=True), states, 1)
+
+
+def benchmark_mcts(game, selection, search_time=0.5, seed=0, batch_size=1):
+    """ Return the number of MCTS simulations per second from the initial state
+        with the given UCB selection and the Heuristic apprentice """
+    mcts = Mcts(selection=selection, seed=seed, batch_size=batch_size)
+    mcts.search(game.new(), Heuristic(game, seed=seed), search_time, always_exploit=True)
+    return int(mcts.tree.N_total[0]) / search_time
+
+
+def run_benchmarks(perft_depth=None, output_path=None, verbose=True):
+    """ Run perft and call timings for all benchmark games.
+        Return the results as a dict and write them as JSON if output_path is given. """
+    results = []
+    for backend, game, default_depth in benchmark_games:
+        depth = default_depth if perft_depth is None else perft_depth
+        result = {
+            "game": game.__name__,
+            "backend": backend,
+            "kwargs": game.kwargs,
+            "perft": benchmark_perft(game, depth),
+            "seconds_per_call": benchmark_calls(game),
+            "search_seconds_per_move": benchmark_search(game),
+            "mcts_simulations_per_second": {
+                selection: benchmark_mcts(game, selection) for selection in ("loop", "vectorized")
+            },
+            "batched_mcts_simulations_per_second": {
+                str(batch_size): benchmark_mcts(game, "loop", batch_size=batch_size) for batch_size in (8, 32)
+            }
+        }
+        results.append(result)
+        if verbose:
+            last = result["perft"][-1]
+            print(game.__name__ + " (" + backend + "): perft(" + str(last["depth"]) + ") = "
+                  + str(last["nodes"]) + ", correct = " + str(last["correct"])
+                  + ", nodes/s = " + str(int(last["nodes_per_second"] or 0)))
+
+    report = {
+        "datetime": datetime.now().strftime('%Y-%m-%d___%H:%M:%S'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "jit_available": jit_available,
+        "results": results
+    }
+    if output_path is not None:
+        with open(output_path, 'w') as file:
+            json.dump(report, file, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the rules engines of the games")
+    parser.add_argument("--depth", type=int, default=None, help="Perft depth of all games")
+    parser.add_argument("--output", default=None, help="Path of the JSON report")
+    args = parser.parse_args()
+    run_benchmarks(perft_depth=args.depth, output_path=args.output)
@@ -0,0 +1,120 @@
+import numpy as np
+
+
+""" Optional JIT-compiled kernels for the game rules and the search.
+    The kernels are compiled with Numba when it is installed. Games select them
+    with the use_jit kwarg, and fall back to their Python code when jit_available
+    is False (the kernels are never called uncompiled). """
+
+try:
+    from numba import njit
+    jit_available = True
+except ImportError:
+    jit_available = False
+
+    def njit(*args, **kwargs):
+        """ Return the function unchanged when Numba is not installed """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+
+# Line directions of in-a-row games: "-", "|", "\" and "/".
+line_rows = (0, 1, 1, 1)
+line_columns = (1, 0, 1, -1)
+
+# The 8 directions of Othello, same order as BaseGameSquareBoard.directions.
+direction_rows = (-1, -1, -1, 0, 0, 1, 1, 1)
+direction_columns = (-1, 0, 1, -1, 1, -1, 0, 1)
+
+
+@njit(cache=True)
+def in_a_row_winner(board, rows, columns, k):
+    """ Return the board value of a player with k pieces in a row, or 0 """
+    for i in range(rows):
+        for j in range(columns):
+            v = board[i * columns + j]
+            if v == 0:
+                continue
+            for d in range(4):
+                r, c = line_rows[d], line_columns[d]
+                end_i, end_j = i + (k - 1) * r, j + (k - 1) * c
+                if end_i >= rows or end_j < 0 or end_j >= columns:
+                    continue
+                n = 1
+                while n < k and board[(i + n * r) * columns + j + n * c] == v:
+                    n += 1
+                if n == k:
+                    return v
+    return 0
+
+
+@njit(cache=True)
+def piece_check_direction(board, rows, columns, i, j, r, c, color):
+    """ Return True if placing color on (i, j) flips pieces in direction (r, c) """
+    i_new, j_new = i + r, j + c
+    if i_new < 0 or i_new >= rows or j_new < 0 or j_new >= columns:
+        return False
+    v = board[i_new * columns + j_new]
+    if v == 0 or v == color:
+        return False
+    i_new, j_new = i_new + r, j_new + c
+    while 0 <= i_new < rows and 0 <= j_new < columns:
+        v = board[i_new * columns + j_new]
+        if v == 0:
+            return False
+        if v == color:
+            return True
+        i_new, j_new = i_new + r, j_new + c
+    return False
+
+
+@njit(cache=True)
+def othello_legal_mask(board, rows, columns, color):
+    """ Return a bool array of the squares where color can be placed """
+    mask = np.zeros(rows * columns, dtype=np.bool_)
+    for i in range(rows):
+        for j in range(columns):
+            if board[i * columns + j] != 0:
+                continue
+            for d in range(8):
+                if piece_check_direction(board, rows, columns, i, j,
+                                         direction_rows[d], direction_columns[d], color):
+                    mask[i * columns + j] = True
+                    break
+    return mask
+
+
+@njit(cache=True)
+def othello_flips(board, rows, columns, a, color):
+    """ Return the indexes of the pieces flipped by placing color on square a.
+        The board is not changed. """
+    flipped = np.empty(rows * columns, dtype=np.int64)
+    n = 0
+    i, j = a // columns, a % columns
+    for d in range(8):
+        r, c = direction_rows[d], direction_columns[d]
+        if piece_check_direction(board, rows, columns, i, j, r, c, color):
+            i_new, j_new = i + r, j + c
+            while board[i_new * columns + j_new] != color:
+                flipped[n] = i_new * columns + j_new
+                n += 1
+                i_new, j_new = i_new + r, j_new + c
+    return flipped[:n]
+
+
+@njit(cache=True)
+def ucb_select(actions, n, q, p, n_total, c):
+    """ Return the first untried action, or else the action that maximizes
+        q + c * p * sqrt(n_total) / (1 + n), where n_total = sum(n). actions should be shuffled. """
+    sqrt_total = np.sqrt(n_total)
+    u_max = -np.inf
+    a_best = -1
+    for a in actions:
+        if n[a] == 0:
+            return a
+        u = q[a] + c * p[a] * sqrt_total / (1 + n[a])
+        if u > u_max:
+            u_max = u
+            a_best = a
+    return a_best
@@ -2,7 +2,7 @@
 from Games.GameLogic import BaseGame
 from ExIt.ExpertIteration import ExpertIteration
 from random import choice as rnd_choice
-from ExIt.Policy import e_greedy, exploit_action, explore
+from ExIt.Policy import e_greedy, exploit_action, explore, legal_values
 
 
 def set_indexes(players: ["BasePlayer"]):
@@ -53,7 +53,7 @@ class BaseExItPlayer(BasePlayer):
         lm = state.get_legal_moves()
 
         # Remove PI values that are not legal moves.
-        pi = [x for i, x in enumerate(pi_pred) if i in lm]
+        pi = legal_values(pi_pred, state.legal_mask())
         if verbose:
             print("pi =", pi)
 
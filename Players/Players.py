@@ -4,6 +4,7 @@ from ExIt.Apprentice.RandomPredictor import RandomPredictor
 from ExIt.Apprentice.Nn import Nn
 from ExIt.Expert.Minimax import Minimax
 from ExIt.Expert.Mcts import Mcts
+from ExIt.Expert.ParallelMcts import ParallelMcts
 from ExIt.ExpertIteration import ExpertIteration
 from Players.BasePlayers import BasePlayer, BaseExItPlayer
 from ExIt.Policy import Policy
@@ -60,14 +61,17 @@ class RandomPlayer(BasePlayer):
 
 
 class BruteForcePlayer(BasePlayer):
-    """ Static Minimax Player with a fixed depth """
+    """ Static Minimax Player with a fixed depth.
+        The leaves are evaluated by the predictor (random evaluations by default). """
 
-    def __init__(self, depth):
+    def __init__(self, depth, predictor=None):
         super().__init__()
         self.depth = depth
         self.minimax = Minimax(fixed_depth=depth)
-        self.predictor = RandomPredictor()
+        self.predictor = RandomPredictor() if predictor is None else predictor
         self.__name__ = type(self).__name__ + "_depth-" + str(depth)
+        if predictor is not None:
+            self.__name__ += "_" + type(predictor).__name__
 
     def move(self, state: BaseGame, verbose=False):
         _, a, v = self.minimax.search(
@@ -92,6 +96,13 @@ class NnMctsPlayer(BaseExItPlayer):
         "min_growing_time": None,
         "soft_z": False,
         "memory": "default",
+        "canonical_memory": False,
+        "use_symmetry": False,
+        "inference_precision": "float32",
+        "evaluation_cache_mb": None,
+        "reuse_tree": False,
+        "use_solver": False,
+        "num_workers": None,
         "branch_prob": 0.0,
         "always_exploit": False
     }
@@ -102,10 +113,25 @@ class NnMctsPlayer(BaseExItPlayer):
         self.kwargs.update(kwargs)
         assert_new_kwargs(self.kwargs)
 
+        if self.kwargs.get("num_workers") is None:
+            expert = Mcts(
+                use_symmetry=self.kwargs.get("use_symmetry"),
+                reuse_tree=self.kwargs.get("reuse_tree"),
+                use_solver=self.kwargs.get("use_solver")
+            )
+        else:
+            # Root parallel search in num_workers processes.
+            expert = ParallelMcts(
+                num_workers=self.kwargs.get("num_workers"),
+                use_symmetry=self.kwargs.get("use_symmetry"),
+                reuse_tree=self.kwargs.get("reuse_tree"),
+                use_solver=self.kwargs.get("use_solver")
+            )
+
         super().__init__(
             ex_it_algorithm=ExpertIteration(
                 apprentice=Nn(),
-                expert=Mcts(),
+                expert=expert,
                 **self.kwargs
             )
         )
@@ -130,6 +156,10 @@ class NnMinimaxPlayer(BaseExItPlayer):
         "growing_depth": False,
         "soft_z": False,
         "memory": "default",
+        "canonical_memory": False,
+        "use_symmetry": False,
+        "inference_precision": "float32",
+        "evaluation_cache_mb": None,
         "branch_prob": 0.0,
         "always_exploit": False
     }
@@ -145,7 +175,8 @@ class NnMinimaxPlayer(BaseExItPlayer):
                 apprentice=Nn(),
                 expert=Minimax(
                     fixed_depth=self.kwargs.get("fixed_depth"),
-                    use_ab=self.kwargs.get("use_ab")
+                    use_ab=self.kwargs.get("use_ab"),
+                    use_symmetry=self.kwargs.get("use_symmetry")
                 ),
                 **self.kwargs
             )
@@ -0,0 +1,47 @@
+from Games.BatchGame import BatchInARowGame, NO_WINNER
+from Games.ConnectFour import ConnectFour
+from Games.MnkInARow import MnkInARow
+import numpy as np
+import unittest
+
+
+class TestBatchInARowGame(unittest.TestCase):
+    """ The batch games must follow the rules of the single game classes """
+
+    def assert_same_games(self, batch, states, name):
+        winners = [NO_WINNER if state.winner is None else state.winner for state in states]
+        np.testing.assert_array_equal(batch.winners, winners, name)
+        np.testing.assert_array_equal(batch.is_game_over(), [state.is_game_over() for state in states], name)
+        np.testing.assert_array_equal(batch.is_terminal(), batch.is_game_over(), name)
+        np.testing.assert_array_equal(batch.legal_masks(), [state.legal_mask() for state in states], name)
+        np.testing.assert_array_equal(batch.get_feature_matrix(), [state.get_feature_vector() for state in states],
+                                      name)
+
+    def test_random_games(self):
+        for game in (MnkInARow(rows=3, columns=3, in_a_row_to_win=3), MnkInARow(rows=5, columns=5, in_a_row_to_win=4),
+                     ConnectFour()):
+            rnd = np.random.RandomState(0)
+            batch = BatchInARowGame(game, 20)
+            states = [game.new() for _ in range(batch.n)]
+            self.assert_same_games(batch, states, game.__name__)
+            while not batch.all_games_over():
+                # Finished games get an arbitrary action, which the batch ignores.
+                actions = np.zeros(batch.n, dtype=int)
+                for i, state in enumerate(states):
+                    if not state.is_game_over():
+                        actions[i] = rnd.choice(state.get_legal_moves())
+                        state.advance(int(actions[i]))
+                batch.advance(actions)
+                self.assert_same_games(batch, states, game.__name__)
+            self.assertTrue(all(state.is_game_over() for state in states))
+
+    def test_illegal_action(self):
+        batch = BatchInARowGame(ConnectFour(), 2)
+        for _ in range(ConnectFour().rows):
+            batch.advance([0, 1])
+        with self.assertRaises(Exception):
+            batch.advance([0, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+from Games.GameLogic import bitboard
+from Games.MnkInARow import MnkInARow
+from Games.ConnectFour import ConnectFour
+from Games.Othello import Othello
+import numpy as np
+import pickle
+import random
+import unittest
+
+
+class TestSetSquare(unittest.TestCase):
+    """ set_square must keep the feature vectors equal to the bitboard of the board """
+
+    def assert_features(self, state):
+        expected = bitboard(state.board, state.player_index_to_board_value(state.turn))
+        np.testing.assert_array_equal(state.get_feature_vector(), expected)
+
+    def test_features_on_10x10_board(self):
+        # The experts pass Python int actions. With more than 63 squares the int8
+        # feature index arithmetic overflowed (numpy int64 actions did not).
+        rnd = random.Random(0)
+        for _ in range(5):
+            state = MnkInARow(rows=10, columns=10, in_a_row_to_win=5)
+            while not state.is_game_over():
+                a = int(rnd.choice(list(state.get_legal_moves())))
+                record = state.advance(a)
+                self.assert_features(state)
+                state.undo(record)
+                self.assert_features(state)
+                state.advance(a)
+                self.assert_features(state)
+
+    def test_features_after_pickle(self):
+        # ParallelMcts sends states to the workers with pickle.
+        for game in (MnkInARow(), ConnectFour(use_bitboard=True), Othello()):
+            rnd = random.Random(0)
+            state = game.new()
+            for _ in range(4):
+                state.advance(int(rnd.choice(list(state.get_legal_moves()))))
+            state = pickle.loads(pickle.dumps(state))
+            self.assert_features(state)
+            while not state.is_game_over():
+                state.advance(int(rnd.choice(list(state.get_legal_moves()))))
+                self.assert_features(state)
+
+
+if __name__ == "__main__":
+    unittest.main()
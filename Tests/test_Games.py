@@ -0,0 +1,89 @@
+from Games.GameLogic import bitboard, compute_zobrist_key
+from Games.ConnectFour import ConnectFour
+from Games.MnkInARow import MnkInARow
+from Games.Othello import Othello
+from Misc.Benchmark import perft, perft_reference
+import numpy as np
+import random
+import unittest
+
+
+# (backend name, game, perft depth). The "jit" backends are equal to "default" without Numba.
+games = [
+    ("default", MnkInARow(rows=3, columns=3, in_a_row_to_win=3), 4),
+    ("last_move", MnkInARow(rows=3, columns=3, in_a_row_to_win=3, last_move_win_check=True), 4),
+    ("jit", MnkInARow(rows=3, columns=3, in_a_row_to_win=3, use_jit=True), 4),
+    ("default", MnkInARow(rows=5, columns=5, in_a_row_to_win=4), 2),
+    ("last_move", MnkInARow(rows=5, columns=5, in_a_row_to_win=4, last_move_win_check=True), 2),
+    ("default", ConnectFour(), 4),
+    ("last_move", ConnectFour(last_move_win_check=True), 4),
+    ("bitboard", ConnectFour(use_bitboard=True), 4),
+    ("jit", ConnectFour(use_jit=True), 4),
+    ("default", Othello(), 3),
+    ("bitboard", Othello(use_bitboard=True), 3),
+    ("jit", Othello(use_jit=True), 3)
+]
+
+
+def snapshot(state):
+    """ Return copies of all fields of the state, except the shared spec and the views """
+    fields = {}
+    for cls in type(state).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if name not in ("spec", "feature_views") and name not in fields:
+                fields[name] = repr(getattr(state, name)) if name == "move_cache" else getattr(state, name)
+    return {name: value.copy() if isinstance(value, (np.ndarray, list)) else value for name, value in fields.items()}
+
+
+class TestMakeUnmake(unittest.TestCase):
+    """ advance and undo of all backends, with the incremental key, features and legal mask """
+
+    def assert_consistent(self, state, name):
+        self.assertEqual(state.key, compute_zobrist_key(state.board, state.turn), name)
+        expected = bitboard(state.board, state.player_index_to_board_value(state.turn))
+        np.testing.assert_array_equal(state.get_feature_vector(), expected, name)
+        legal_moves = [] if state.is_game_over() else state.get_legal_moves()
+        np.testing.assert_array_equal(np.flatnonzero(state.legal_mask()), legal_moves, name)
+        if isinstance(state, Othello) and not state.is_game_over():
+            # Othello returns the legal moves from the mask, so compare with the moves generated from the board.
+            np.testing.assert_array_equal(legal_moves, state.get_legal_moves_2(state.turn), name)
+
+    def assert_equal_states(self, before, after, name):
+        self.assertEqual(before.keys(), after.keys(), name)
+        for field in before:
+            if isinstance(before[field], np.ndarray):
+                np.testing.assert_array_equal(before[field], after[field], name + " " + field)
+            else:
+                self.assertEqual(before[field], after[field], name + " " + field)
+
+    def test_random_games(self):
+        for backend, game, _ in games:
+            name = game.__name__ + " (" + backend + ")"
+            rnd = random.Random(0)
+            for _ in range(10):
+                state = game.new()
+                self.assert_consistent(state, name)
+                while not state.is_game_over():
+                    # The experts pass Python int actions.
+                    a = int(rnd.choice(list(state.get_legal_moves())))
+                    before = snapshot(state)
+                    record = state.advance(a)
+                    self.assert_consistent(state, name)
+                    after = snapshot(state)
+
+                    state.undo(record)
+                    self.assert_equal_states(before, snapshot(state), name)
+                    self.assert_consistent(state, name)
+
+                    state.advance(a)
+                    self.assert_equal_states(after, snapshot(state), name)
+
+    def test_perft(self):
+        for backend, game, depth in games:
+            reference = perft_reference[game.__name__]
+            for d in range(1, depth + 1):
+                self.assertEqual(perft(game.new(), d), reference[d - 1], game.__name__ + " (" + backend + ")")
+
+
+if __name__ == "__main__":
+    unittest.main()
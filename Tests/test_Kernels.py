@@ -0,0 +1,82 @@
+from Misc.Kernels import jit_available, in_a_row_winner, othello_legal_mask, othello_flips, ucb_select
+from Games.ConnectFour import ConnectFour
+from Games.MnkInARow import MnkInARow
+from Games.Othello import Othello
+from ExIt.Expert.Mcts import Mcts
+from ExIt.Expert.MctsTree import MctsTree
+import numpy as np
+import random
+import unittest
+
+
+@unittest.skipUnless(jit_available, "Numba is not installed")
+class TestKernels(unittest.TestCase):
+    """ The compiled kernels must give the same results as the Python rules """
+
+    def test_compiled(self):
+        for kernel in (in_a_row_winner, othello_legal_mask, othello_flips, ucb_select):
+            self.assertTrue(hasattr(kernel, "py_func"), kernel.__name__ + " is not compiled")
+
+    def test_games(self):
+        # Play the same random games with and without the kernels.
+        for python_game, jit_game in [
+            (MnkInARow(rows=3, columns=3, in_a_row_to_win=3), MnkInARow(rows=3, columns=3, in_a_row_to_win=3, use_jit=True)),
+            (MnkInARow(rows=7, columns=7, in_a_row_to_win=4), MnkInARow(rows=7, columns=7, in_a_row_to_win=4, use_jit=True)),
+            (ConnectFour(), ConnectFour(use_jit=True)),
+            (Othello(), Othello(use_jit=True)),
+            (Othello(rows=6, columns=6), Othello(rows=6, columns=6, use_jit=True))
+        ]:
+            self.assertTrue(jit_game.use_jit)
+            rnd = random.Random(0)
+            for _ in range(20):
+                python_state, jit_state = python_game.new(), jit_game.new()
+                while not python_state.is_game_over():
+                    np.testing.assert_array_equal(python_state.get_legal_moves(), jit_state.get_legal_moves())
+                    a = int(rnd.choice(list(python_state.get_legal_moves())))
+                    python_state.advance(a)
+                    jit_state.advance(a)
+                    np.testing.assert_array_equal(python_state.board, jit_state.board)
+                    self.assertEqual(python_state.turn, jit_state.turn)
+                    self.assertEqual(python_state.winner, jit_state.winner)
+                self.assertTrue(jit_state.is_game_over())
+
+    def test_othello_flips(self):
+        rnd = random.Random(0)
+        for _ in range(5):
+            state = Othello()
+            while not state.is_game_over():
+                color = state.player_index_to_board_value(state.turn)
+                for a in state.get_legal_moves():
+                    board = state.board.copy()
+                    flips = othello_flips(state.board, state.rows, state.columns, int(a), color)
+                    np.testing.assert_array_equal(state.board, board)
+                    record = state.advance(int(a))
+                    self.assertEqual(sorted(int(i) for i in flips), sorted(int(i) for i in record[1]))
+                    state.undo(record)
+                state.advance(int(rnd.choice(list(state.get_legal_moves()))))
+
+    def test_ucb_select(self):
+        # Compare with the loop selection of Mcts on a game without the kernels.
+        state = ConnectFour()
+        mcts = Mcts(selection="loop")
+        rnd = np.random.RandomState(0)
+        for _ in range(200):
+            mcts.tree = MctsTree(state.num_actions)
+            node = mcts.tree.add(0, rnd.dirichlet(np.ones(state.num_actions)), 0)
+            mcts.tree.N[node] = rnd.randint(1, 50, state.num_actions)
+            mcts.tree.Q[node] = rnd.uniform(-1, 1, state.num_actions)
+            mcts.tree.N_total[node] = mcts.tree.N[node].sum()
+            tree = mcts.tree
+            lm = state.get_legal_moves()
+            a = ucb_select(rnd.permutation(lm), tree.N[node], tree.Q[node], tree.P[node], tree.N_total[node], mcts.c)
+            self.assertEqual(a, mcts.select(state, node))
+
+            # Untried actions are selected first.
+            tree.N[node, lm[3]] = 0
+            tree.N_total[node] = tree.N[node].sum()
+            a = ucb_select(rnd.permutation(lm), tree.N[node], tree.Q[node], tree.P[node], tree.N_total[node], mcts.c)
+            self.assertEqual(a, lm[3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+from ExIt.Apprentice.Heuristic import Heuristic
+from ExIt.Expert.Mcts import Mcts, proven_visits
+from ExIt.Expert.MctsTree import MctsTree
+from Games.ConnectFour import ConnectFour
+from Games.MnkInARow import MnkInARow
+import numpy as np
+import random
+import unittest
+
+
+def negamax(state, original_turn):
+    """ Return the exact value of the state seen from the player of original_turn """
+    if state.is_game_over():
+        return state.get_result(original_turn).value
+    values = []
+    for a in state.get_legal_moves():
+        record = state.advance(a)
+        values.append(negamax(state, original_turn))
+        state.undo(record)
+    return max(values) if state.turn == original_turn else min(values)
+
+
+class TestSelection(unittest.TestCase):
+
+    def test_seeded_selection(self):
+        # Mcts with the same seed select the same actions.
+        state = ConnectFour()
+        for selection in ("loop", "vectorized"):
+            actions = []
+            for _ in range(2):
+                mcts = Mcts(selection=selection, seed=0)
+                mcts.tree = MctsTree(state.num_actions)
+                node = mcts.tree.add(0, np.full(state.num_actions, 1 / state.num_actions), 0)
+                selected = []
+                for _ in range(30):
+                    a = mcts.select(state, node)
+                    mcts.tree.update(node, a, 0)
+                    selected.append(a)
+                actions.append(selected)
+            self.assertEqual(actions[0], actions[1])
+
+
+class TestTreeReuse(unittest.TestCase):
+
+    def test_symmetric_predictions_are_discarded(self):
+        # The predictions of the symmetric states do not accumulate over a game.
+        state = ConnectFour()
+        predictor = Heuristic(state, seed=0)
+        mcts = Mcts(use_symmetry=True, reuse_tree=True, seed=0)
+        for _ in range(4):
+            a, _, _ = mcts.search(state, predictor, 0.05, always_exploit=True)
+            self.assertLessEqual(len(mcts.E), mcts.tree.size)
+            state.advance(a)
+            self.assertTrue(mcts.reroot(state, predictor))
+            self.assertEqual(len(mcts.E), 0)
+
+
+class TestSolver(unittest.TestCase):
+
+    def test_proven_visits(self):
+        values = np.array([1, 0, np.nan, 1])
+        np.testing.assert_array_equal(proven_visits(np.array([0, 5, 3, 0]), values, 1), [1, 0, 0, 1])
+        np.testing.assert_array_equal(proven_visits(np.array([4, 5, 3, 0]), values, 1), [4, 0, 0, 1])
+        np.testing.assert_array_equal(proven_visits(np.array([4, 0, 3, 2]), values, 0), [0, 1, 0, 0])
+        # All actions of a proven loss can be chosen.
+        np.testing.assert_array_equal(proven_visits(np.array([4, 0, 3, 2]), values, -1), [4, 0, 3, 2])
+
+    def test_late_tic_tac_toe_positions(self):
+        game = MnkInARow(rows=3, columns=3, in_a_row_to_win=3)
+        predictor = Heuristic(game, seed=0)
+        rnd = random.Random(0)
+        for _ in range(10):
+            state = game.new()
+            for _ in range(rnd.randint(4, 6)):
+                if not state.is_game_over():
+                    state.advance(int(rnd.choice(list(state.get_legal_moves()))))
+            if state.is_game_over():
+                continue
+            exact = negamax(state.copy(), state.turn)
+            for kwargs in ({}, {"batch_size": 4}):
+                mcts = Mcts(use_solver=True, seed=0, **kwargs)
+                a, a_best, q = mcts.search(state, predictor, 10.0, always_exploit=False)
+                self.assertTrue(mcts.tree.is_proven(mcts.tree.get(state.get_key())))
+                self.assertEqual(q, exact)
+                child = state.copy()
+                child.advance(a_best)
+                self.assertEqual(negamax(child, state.turn), exact)
+                if exact >= 0:
+                    child = state.copy()
+                    child.advance(a)
+                    self.assertEqual(negamax(child, state.turn), exact)
+
+
+if __name__ == "__main__":
+    unittest.main()